@@ -0,0 +1,130 @@
+# batch.py
+# Пакетная обработка записанных материалов без камеры и Telegram: детекция и распознавание
+# работают с максимальной скоростью, без пауз основного цикла.
+#
+#   python batch.py footage/*.mp4 frames_dir synthetic:moving_blob --processes 4 --output events.jsonl
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import (
+    MIN_CONTOUR_AREA, FRAME_WIDTH, FRAME_HEIGHT,
+    MOTION_DETECTION_MODE, MOTION_DOWNSCALE, MOTION_BACKGROUND, MOTION_LEARNING_RATE, VIDEO_NO_MOTION_STOP_DELAY
+)
+from motion_detection import MotionDetector, SyntheticSource, ScriptedSource, open_source
+from motion_detection.background import BACKGROUND_ENGINES
+
+logger = logging.getLogger(__name__)
+
+
+def process_source(spec, settings, identify=True, event_gap=VIDEO_NO_MOTION_STOP_DELAY, synthetic_frames=900):
+    source = open_source(spec, width=settings["frame_width"], height=settings["frame_height"])
+    if source is None:
+        return {"source": spec, "error": "не удалось открыть источник", "events": []}
+    if isinstance(source, (SyntheticSource, ScriptedSource)) and source.frames is None:
+        source.frames = synthetic_frames  # синтетический поток иначе бесконечен
+
+    detector = MotionDetector(**settings)
+    identifier = None
+    if identify:
+        from image_processing import ObjectIdentifier
+        identifier = ObjectIdentifier()
+
+    # Событие - серия кадров с движением, разделенная паузами не длиннее event_gap секунд
+    events = []
+    current = None
+    frames = 0
+    started = time.perf_counter()
+    try:
+        for timestamp, frame in source:
+            frames += 1
+            regions = detector.analyze_frame(frame)
+            if regions:
+                if current is None:
+                    current = {"source": spec, "start": round(timestamp, 3), "end": round(timestamp, 3),
+                               "frames": 0}
+                    if identifier:
+                        current["objects"] = identifier.identify_objects(frame_data=frame, regions=regions)
+                current["end"] = round(timestamp, 3)
+                current["frames"] += 1
+            elif current is not None and timestamp - current["end"] > event_gap:
+                events.append(current)
+                current = None
+    finally:
+        source.release()
+        if identifier:
+            identifier.close()
+    if current is not None:
+        events.append(current)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "source": spec,
+        "frames": frames,
+        "seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 1) if elapsed else 0.0,
+        "events": events,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная детекция движения по записям")
+    parser.add_argument("sources", nargs="+", help="видеофайлы, каталоги с кадрами или synthetic:<сценарий>")
+    parser.add_argument("--processes", type=int, default=1, help="число процессов (по источнику на процесс)")
+    parser.add_argument("--output", help="файл для событий в формате JSON Lines (по умолчанию stdout)")
+    parser.add_argument("--min-area", type=int, default=MIN_CONTOUR_AREA)
+    parser.add_argument("--mode", choices=("full", "tiered"), default=MOTION_DETECTION_MODE)
+    parser.add_argument("--downscale", type=int, default=MOTION_DOWNSCALE)
+    parser.add_argument("--background", choices=BACKGROUND_ENGINES, default=MOTION_BACKGROUND)
+    parser.add_argument("--learning-rate", type=float, default=MOTION_LEARNING_RATE)
+    parser.add_argument("--event-gap", type=float, default=VIDEO_NO_MOTION_STOP_DELAY,
+                        help="пауза без движения (сек), после которой событие закрывается")
+    parser.add_argument("--no-identify", action="store_true", help="не запускать распознавание объектов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        stream=sys.stderr)
+
+    settings = {
+        "min_area": args.min_area,
+        "frame_width": FRAME_WIDTH,
+        "frame_height": FRAME_HEIGHT,
+        "mode": args.mode,
+        "downscale": args.downscale,
+        "background": args.background,
+        "learning_rate": args.learning_rate,
+    }
+    jobs = [(spec, settings, not args.no_identify, args.event_gap) for spec in args.sources]
+
+    started = time.perf_counter()
+    if args.processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            results = list(pool.map(process_source, *zip(*jobs)))
+    else:
+        results = [process_source(*job) for job in jobs]
+    elapsed = time.perf_counter() - started
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for result in results:
+            if "error" in result:
+                logger.error(f"{result['source']}: {result['error']}")
+                continue
+            logger.info(f"{result['source']}: кадров {result['frames']}, {result['fps']} FPS, "
+                        f"событий {len(result['events'])}")
+            for event in result["events"]:
+                output.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    total_frames = sum(result.get("frames", 0) for result in results)
+    logger.info(f"Всего кадров {total_frames} за {elapsed:.1f} сек "
+                f"({total_frames / elapsed if elapsed else 0:.1f} FPS)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/bench_background.py
+# Сравнение моделей фона с разностью соседних кадров: время на кадр, выделения памяти и срабатывания.
+# Запуск из корня проекта: python -m benchmarks.bench_background --width 1280 --height 720
+import argparse
+import time
+import tracemalloc
+
+import cv2
+
+from motion_detection import MotionDetector, SyntheticSource
+from motion_detection.background import BACKGROUND_ENGINES
+from motion_detection.sources import SYNTHETIC_SCENARIOS
+
+# Выделение больше этого за кадр считаем выделением буфера изображения, а не служебной мелочью
+LARGE_ALLOCATION = 4 * 1024
+
+
+def run(detector, frames, warmup):
+    for frame in frames[:warmup]:
+        detector.analyze_frame(frame)
+
+    motion_frames = 0
+    allocated = 0
+    allocating_frames = 0
+    elapsed = 0.0
+    tracemalloc.start()
+    try:
+        for frame in frames[warmup:]:
+            # Пик относительно текущего объема - сколько памяти кадр выделил поверх уже занятой
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            if detector.analyze_frame(frame):
+                motion_frames += 1
+            elapsed += time.perf_counter() - started
+            frame_allocated = tracemalloc.get_traced_memory()[1] - current
+            allocated += frame_allocated
+            allocating_frames += frame_allocated > LARGE_ALLOCATION
+    finally:
+        tracemalloc.stop()
+    count = len(frames) - warmup
+    return elapsed / count * 1000, allocated / count / 1024, allocating_frames, motion_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк моделей фона")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--warmup", type=int, default=30, help="кадров на обучение модели и выделение буферов")
+    parser.add_argument("--learning-rate", type=float, default=0.05)
+    parser.add_argument("--scenarios", nargs="+", default=list(SYNTHETIC_SCENARIOS), choices=SYNTHETIC_SCENARIOS)
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)  # время на одно ядро
+    print(f"Кадры {args.width}x{args.height}, {args.frames - args.warmup} замеров на сцену, 1 поток OpenCV")
+    print(f"{'сцена':<12} {'режим':<7} {'фон':<8} {'мс/кадр':>8} {'КБ/кадр':>9} {'кадров с выдел.':>16} "
+          f"{'движение':>9}")
+    for scenario in args.scenarios:
+        frames = [frame for _, frame in SyntheticSource(scenario, width=args.width, height=args.height,
+                                                        frames=args.frames, seed=42)]
+        for mode in ("full", "tiered"):
+            for engine in BACKGROUND_ENGINES:
+                detector = MotionDetector(frame_width=args.width, frame_height=args.height, mode=mode,
+                                          background=engine, learning_rate=args.learning_rate)
+                ms, kb, allocating_frames, motion_frames = run(detector, frames, args.warmup)
+                print(f"{scenario:<12} {mode:<7} {engine:<8} {ms:>8.2f} {kb:>9.1f} {allocating_frames:>16} "
+                      f"{motion_frames:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_motion.py
+# Сравнение полного и многоуровневого детектора движения на синтетических кадрах.
+# Запуск из корня проекта: python -m benchmarks.bench_motion --width 1920 --height 1080
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from motion_detection import MotionDetector
+
+
+def make_frames(width, height, count, motion_every=30, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+    frames = []
+    blob = max(40, height // 6)
+    for i in range(count):
+        noise = rng.integers(-4, 5, background.shape, dtype=np.int16)
+        frame = np.clip(background.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        # Раз в motion_every кадров по сцене проходит объект длиной в 5 кадров
+        phase = i % motion_every
+        if phase < 5:
+            x = (phase * blob) % (width - blob)
+            cv2.rectangle(frame, (x, height // 3), (x + blob, height // 3 + blob), (255, 255, 255), -1)
+        frames.append(frame)
+    return frames
+
+
+def run(detector, frames, repeat):
+    motion_frames = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            if detector.analyze_frame(frame):
+                motion_frames += 1
+    elapsed = time.perf_counter() - started
+    return len(frames) * repeat / elapsed, motion_frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк детектора движения")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--min-area", type=int, default=1000)
+    parser.add_argument("--downscale", type=int, default=4)
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)  # FPS на одно ядро
+    frames = make_frames(args.width, args.height, args.frames)
+
+    print(f"Кадры {args.width}x{args.height}, {args.frames * args.repeat} шт., 1 поток OpenCV")
+    for mode in ("full", "tiered"):
+        detector = MotionDetector(min_area=args.min_area, frame_width=args.width, frame_height=args.height,
+                                  mode=mode, downscale=args.downscale)
+        fps, motion_frames = run(detector, frames, args.repeat)
+        print(f"{mode:>7}: {fps:8.1f} FPS, кадров с движением: {motion_frames}, "
+              f"полных проходов: {detector.full_passes if mode == 'tiered' else args.frames * args.repeat}")
+
+
+if __name__ == "__main__":
+    main()
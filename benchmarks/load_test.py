@@ -0,0 +1,281 @@
+# benchmarks/load_test.py
+# Нагрузочный тест всего приложения (main.py) без камер и Telegram: N синтетических камер по сценарию,
+# бот работает через заглушку Bot API. По окончании - задержка оповещений от кадра до доставки,
+# пропускная способность анализа и отправки, загрузка процессора и память.
+#
+#   python -m benchmarks.load_test --cameras 4 --duration 60 --output load.json
+#   python -m benchmarks.load_test --cameras 8 --mode video --latency-ms 300 --flood-rate 0.05
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.telegram_stub import TelegramStub
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_ID = 1001
+_SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Текстовый формат Prometheus -> {(имя, ((метка, значение), ...)): значение}
+def parse_exposition(text):
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            labels = tuple(sorted(_LABEL.findall(match.group("labels") or "")))
+            samples[(match.group("name"), labels)] = float(match.group("value"))
+    return samples
+
+
+def _select(samples, name, **labels):
+    wanted = {(key, str(value)) for key, value in labels.items()}
+    return {key_labels: value for (metric, key_labels), value in samples.items()
+            if metric == name and wanted <= set(key_labels)}
+
+
+def total(samples, name, **labels):
+    return sum(_select(samples, name, **labels).values())
+
+
+# Квантиль по корзинам гистограммы, как histogram_quantile в Prometheus (корзины всех меток складываются)
+def histogram_quantile(samples, name, q, **labels):
+    buckets = {}
+    for key_labels, value in _select(samples, name + "_bucket", **labels).items():
+        le = dict(key_labels)["le"]
+        bound = float("inf") if le == "+Inf" else float(le)
+        buckets[bound] = buckets.get(bound, 0) + value
+    bounds = sorted(buckets)
+    if not bounds or not buckets[bounds[-1]]:
+        return None
+    rank = q * buckets[bounds[-1]]
+    lower, below = 0.0, 0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return lower
+            count = buckets[bound] - below
+            return lower + (bound - lower) * (rank - below) / count if count else bound
+        lower, below = bound, buckets[bound]
+    return lower
+
+
+def latency_summary(samples, name, **labels):
+    count = total(samples, name + "_count", **labels)
+    if not count:
+        return {"count": 0}
+    return {
+        "count": int(count),
+        "mean_ms": round(total(samples, name + "_sum", **labels) / count * 1000, 1),
+        "p50_ms": round(histogram_quantile(samples, name, 0.5, **labels) * 1000, 1),
+        "p95_ms": round(histogram_quantile(samples, name, 0.95, **labels) * 1000, 1),
+    }
+
+
+async def fetch_metrics(url):
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
+                return parse_exposition(await response.text())
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None
+
+
+def child_usage():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def build_env(args, api_url, metrics_port, workdir):
+    sources = [f"synthetic:{args.scene}@{args.fps:g}#{index}" for index in range(args.cameras)]
+    env = dict(os.environ)
+    # Переменные окружения важнее .env, остальные настройки можно переопределить так же
+    env.update({
+        "TELEGRAM_BOT_TOKEN": "123456:LOADTEST",
+        "ALLOWED_USER_IDS": ",".join(str(USER_ID + i) for i in range(args.users)),
+        "TELEGRAM_API_URL": api_url,
+        "CAMERA_SOURCES": ",".join(sources),
+        "FRAME_WIDTH": str(args.width),
+        "FRAME_HEIGHT": str(args.height),
+        "METRICS_ENABLED": "true",
+        "METRICS_HOST": "127.0.0.1",
+        "METRICS_PORT": str(metrics_port),
+        "SCREENSHOT_DIR": os.path.join(workdir, "screenshots"),
+        "VIDEO_RECORD_PATH": os.path.join(workdir, "videos"),
+        "EVENTS_DB": os.path.join(workdir, "events.db"),
+        "ZONES_FILE": os.path.join(workdir, "zones.json"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    return env
+
+
+def stop_process(process, timeout=120):
+    if process.poll() is not None:
+        return
+    # Ctrl+C: main.py останавливает камеры, дописывает видео и дожидается отправки начатых оповещений
+    if os.name == "posix":
+        process.send_signal(signal.SIGINT)
+    else:
+        process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def run(args):
+    stub = TelegramStub(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, flood_rate=args.flood_rate,
+                        retry_after=args.retry_after)
+    for index in range(args.users):
+        stub.press(USER_ID + index, f"set_mode_{args.mode}")
+        stub.press(USER_ID + index, "toggle_monitoring_on")
+    api_url = await stub.start()
+    metrics_port = free_port()
+    metrics_url = f"http://127.0.0.1:{metrics_port}/metrics"
+
+    with tempfile.TemporaryDirectory(prefix="motion_load_") as workdir:
+        log_path = os.path.join(workdir, "main.log")
+        usage_before = child_usage()
+        with open(log_path, "w", encoding="utf-8") as log:
+            process = subprocess.Popen([sys.executable, "main.py"], cwd=PROJECT_ROOT, stdout=log,
+                                       stderr=subprocess.STDOUT, env=build_env(args, api_url, metrics_port, workdir),
+                                       start_new_session=os.name == "posix")
+            started = time.monotonic()
+            try:
+                # Отсчет длительности - с первого кадра, а не с загрузки модулей
+                ready_at = None
+                while time.monotonic() - started < args.startup_timeout and process.poll() is None:
+                    samples = await fetch_metrics(metrics_url)
+                    if samples and total(samples, "camera_frames_total"):
+                        ready_at = time.monotonic()
+                        break
+                    await asyncio.sleep(0.5)
+                if ready_at is None:
+                    with open(log_path, encoding="utf-8") as log_tail:
+                        raise RuntimeError(f"Приложение не запустилось за {args.startup_timeout} сек:\n"
+                                           f"{log_tail.read()[-4000:]}")
+                print(f"Запуск: {ready_at - started:.1f} сек, нагрузка {args.duration} сек...")
+                baseline = await fetch_metrics(metrics_url) or {}
+                await asyncio.sleep(args.duration)
+                samples = await fetch_metrics(metrics_url) or {}
+                elapsed = time.monotonic() - ready_at
+            finally:
+                await asyncio.to_thread(stop_process, process, args.stop_timeout)
+                usage_after = child_usage()
+                await stub.stop()
+        if process.returncode != 0:
+            with open(log_path, encoding="utf-8") as log:
+                print(f"main.py завершился с кодом {process.returncode}:\n{log.read()[-4000:]}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "seconds": round(elapsed, 1),
+        "frames": {},
+        "alerts": {kind: latency_summary(samples, "alert_delivery_seconds", kind=kind) for kind in ("photo", "video")},
+        "stages": {name: latency_summary(samples, name) for name in
+                   ("pipeline_step_seconds", "motion_detect_seconds", "identify_seconds", "telegram_request_seconds",
+                    "telegram_queue_wait_seconds")},
+        "telegram": stub.stats(),
+    }
+    for camera in range(args.cameras):
+        name = f"cam{camera + 1}" if args.cameras > 1 else "cam1"
+        # camera_frames_total считает захваченные кадры, анализы - счетчик гистограммы motion_detect_seconds
+        frames = total(samples, "camera_frames_total", camera=name) - total(baseline, "camera_frames_total",
+                                                                             camera=name)
+        analyzed = total(samples, "motion_detect_seconds_count", camera=name) - \
+            total(baseline, "motion_detect_seconds_count", camera=name)
+        dropped = total(samples, "camera_dropped_frames_total", camera=name) - \
+            total(baseline, "camera_dropped_frames_total", camera=name)
+        report["frames"][name] = {"capture_fps": round(frames / elapsed, 1),
+                                  "analyzed_fps": round(analyzed / elapsed, 1), "dropped": int(dropped)}
+    # Темп доставки - только за окно нагрузки, без запуска и остановки
+    delivered = sum(1 for delivered_at, _, _ in stub.deliveries if ready_at <= delivered_at <= ready_at + elapsed)
+    report["telegram"]["delivered_per_minute"] = round(delivered * 60 / elapsed, 1)
+    report["identify_dropped"] = int(total(samples, "identify_dropped_total"))
+    report["flood_waits_seen"] = int(total(samples, "telegram_flood_waits_total"))
+    if usage_before is not None and usage_after is not None:
+        cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+        # ru_maxrss в Linux - в килобайтах, это пик самого крупного из процессов приложения
+        report["resources"] = {"cpu_seconds": round(cpu, 1),
+                               "cpu_cores_avg": round(cpu / (time.monotonic() - started), 2),
+                               "peak_rss_mb": round(usage_after.ru_maxrss / 1024, 1)}
+    return report
+
+
+def print_report(report):
+    print(f"Камер: {report['settings']['cameras']}, {report['seconds']} сек")
+    for name, stats in report["frames"].items():
+        print(f"  {name}: захват {stats['capture_fps']} FPS, анализ {stats['analyzed_fps']} FPS, "
+              f"пропущено кадров {stats['dropped']}")
+    for kind, stats in report["alerts"].items():
+        if stats["count"]:
+            print(f"  оповещения {kind}: {stats['count']}, p50 {stats['p50_ms']} мс, p95 {stats['p95_ms']} мс")
+    for name, stats in report["stages"].items():
+        if stats["count"]:
+            print(f"  {name}: n={stats['count']}, p50 {stats['p50_ms']} мс, p95 {stats['p95_ms']} мс")
+    telegram = report["telegram"]
+    print(f"  Telegram: доставлено {telegram['delivered']} ({telegram['delivered_per_minute']}/мин), "
+          f"загружено {telegram['upload_mb']} МБ, flood-wait {sum(telegram['flood_waits'].values())}")
+    print(f"  вытеснено заданий распознавания: {report['identify_dropped']}")
+    if "resources" in report:
+        resources = report["resources"]
+        print(f"  процессор: {resources['cpu_seconds']} сек ({resources['cpu_cores_avg']} ядра в среднем), "
+              f"пиковый RSS {resources['peak_rss_mb']} МБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест приложения с синтетическими камерами")
+    parser.add_argument("--cameras", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=60, help="секунд нагрузки после первого кадра")
+    parser.add_argument("--scene", default="static=4+moving_blob=4",
+                        help="сценарий камеры, как в synthetic:<сценарий>")
+    parser.add_argument("--fps", type=float, default=15)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--mode", choices=("photo", "video"), default="photo")
+    parser.add_argument("--users", type=int, default=1, help="получателей оповещений")
+    parser.add_argument("--latency-ms", type=float, default=100, help="задержка ответа Bot API")
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--flood-rate", type=float, default=0, help="доля отправок с ответом flood-wait")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--stop-timeout", type=float, default=120, help="ожидание остановки main.py")
+    parser.add_argument("--output", help="сохранить отчет в JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# benchmarks/run.py
+# Бенчмарк горячих путей: детекция, распознавание, скриншот, запись видео, подпись.
+# Работает без камеры и Telegram на синтетических детерминированных сценах.
+#
+#   python -m benchmarks.run --output bench.json
+#   python -m benchmarks.run --output new.json --compare bench.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from image_processing import ObjectIdentifier, RegionLabelCache, format_detected_objects
+from motion_detection import MotionDetector, SyntheticSource
+from motion_detection.sources import SYNTHETIC_SCENARIOS
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    values = sorted(samples)
+    mean = statistics.fmean(values) if values else 0.0
+    return {
+        "count": len(values),
+        "mean_ms": round(mean * 1000, 4),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 4),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 4),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 4),
+        "max_ms": round(values[-1] * 1000, 4) if values else 0.0,
+        "fps": round(1.0 / mean, 1) if mean else 0.0,
+    }
+
+
+# Замер одной стадии: задержка каждого вызова и пик памяти Python/numpy по tracemalloc.
+# tracemalloc замедляет каждое выделение памяти, поэтому время и память замеряются разными проходами.
+# setup и teardown вызываются вокруг каждого прохода, чтобы оба шли с одного и того же состояния.
+def measure(stage, items, setup=None, teardown=None):
+    def run_pass(samples=None):
+        if setup:
+            setup()
+        try:
+            for item in items:
+                started = time.perf_counter()
+                stage(item)
+                if samples is not None:
+                    samples.append(time.perf_counter() - started)
+        finally:
+            if teardown:
+                teardown()
+
+    samples = []
+    run_pass(samples)
+    tracemalloc.start()
+    try:
+        run_pass()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = summarize(samples)
+    result["peak_traced_kb"] = round(peak / 1024, 1)
+    return result
+
+
+def make_frames(scenario, width, height, count, fps=15):
+    return list(SyntheticSource(scenario, width=width, height=height, fps=fps, frames=count, seed=42))
+
+
+def bench_scene(scenario, width, height, frames, mode, identify_frames, workdir):
+    scene = make_frames(scenario, width, height, frames)
+    images = [image for _, image in scene]
+    results = {}
+
+    detector = None
+    motion_frames = []
+
+    # Каждый проход - со свежим детектором: без предыдущих кадров и накопленной модели фона
+    def reset_detector():
+        nonlocal detector
+        detector = MotionDetector(frame_width=width, frame_height=height, mode=mode)
+        detector.analyze_frame(images[0])
+        motion_frames.clear()
+
+    def detect(image):
+        regions = detector.analyze_frame(image)
+        if regions:
+            motion_frames.append((image, regions))
+
+    results["detect_motion"] = measure(detect, images[1:], setup=reset_detector)
+    results["detect_motion"]["motion_frames"] = len(motion_frames)
+
+    identifier = ObjectIdentifier()
+    try:
+        results["identify_objects"] = measure(lambda image: identifier.identify_objects(frame_data=image),
+                                              images[:identify_frames])
+        # Только области движения, без кеша и с кешем меток
+        if motion_frames:
+            def identify_regions(item):
+                identifier.identify_objects(frame_data=item[0], regions=item[1])
+
+            results["identify_regions"] = measure(identify_regions, motion_frames[:identify_frames])
+            results["identify_regions_cached"] = measure(
+                identify_regions, motion_frames[:identify_frames],
+                setup=lambda: setattr(identifier, "cache", RegionLabelCache()))
+            results["identify_regions_cached"]["cache"] = identifier.cache.stats()
+    finally:
+        identifier.close()
+
+    shots_dir = os.path.join(workdir, f"shots_{scenario}_{width}x{height}")
+    results["capture_screenshot"] = measure(lambda image: detector.capture_screenshot(image, shots_dir),
+                                            images[:min(len(images), 30)])
+
+    # Запись тем же путем, что и с камеры: write_video_frame -> очередь VideoRecorder -> поток записи.
+    # Кадр считается записанным, когда поток записи отдал его VideoWriter.
+    video_dir = os.path.join(workdir, f"video_{scenario}_{width}x{height}")
+    fps = 15
+
+    def record(item):
+        index, image = item
+        recorder = detector.recorder
+        detector.write_video_frame(image, timestamp=index / fps)
+        while recorder.written_frames <= index and recorder.thread.is_alive():
+            time.sleep(0)
+
+    results["record_video_frame"] = measure(
+        record, list(enumerate(images)),
+        setup=lambda: detector.start_video_recording(directory=video_dir, fps=fps),
+        teardown=detector.stop_video_recording)
+
+    labels = [["человек"], ["человек", "человек", "движение"], ["движение"], []]
+    results["format_detected_objects"] = measure(format_detected_objects, labels * 250)
+    return results
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    for key, stages in current["results"].items():
+        base_stages = baseline.get("results", {}).get(key)
+        if not base_stages:
+            continue
+        for stage, stats in stages.items():
+            base = base_stages.get(stage)
+            if not base or not base.get("p50_ms"):
+                continue
+            change = (stats["p50_ms"] - base["p50_ms"]) / base["p50_ms"]
+            if change > threshold:
+                regressions.append((key, stage, base["p50_ms"], stats["p50_ms"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк горячих путей детекции, распознавания и записи")
+    parser.add_argument("--scenarios", nargs="+", default=list(SYNTHETIC_SCENARIOS), choices=SYNTHETIC_SCENARIOS)
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--frames", type=int, default=90, help="кадров на сцену")
+    parser.add_argument("--identify-frames", type=int, default=10, help="кадров для распознавания")
+    parser.add_argument("--mode", choices=("full", "tiered"), default="tiered")
+    parser.add_argument("--threads", type=int, default=1, help="потоков OpenCV (1 - замер на одно ядро)")
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого запуска для поиска регрессий")
+    parser.add_argument("--threshold", type=float, default=0.15, help="допустимый рост p50 (доля)")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(args.threads)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "settings": {"frames": args.frames, "identify_frames": args.identify_frames, "mode": args.mode,
+                     "threads": args.threads},
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="motion_bench_") as workdir:
+        for resolution in args.resolutions:
+            width, height = RESOLUTIONS[resolution]
+            for scenario in args.scenarios:
+                key = f"{scenario}@{resolution}"
+                results = bench_scene(scenario, width, height, args.frames, args.mode, args.identify_frames,
+                                      workdir)
+                report["results"][key] = results
+                print(f"{key}")
+                for stage, stats in results.items():
+                    print(f"  {stage:<24} p50 {stats['p50_ms']:>9.3f} ms  p99 {stats['p99_ms']:>9.3f} ms  "
+                          f"{stats['fps']:>9.1f} FPS  пик {stats['peak_traced_kb']:>9.1f} КБ")
+
+    if resource is not None:
+        # ru_maxrss в Linux - в килобайтах
+        report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        print(f"Пиковый RSS процесса: {report['peak_rss_mb']} МБ")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for key, stage, before, after, change in regressions:
+            print(f"РЕГРЕССИЯ {key} {stage}: p50 {before:.3f} -> {after:.3f} ms (+{change * 100:.0f}%)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
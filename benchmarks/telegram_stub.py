@@ -0,0 +1,183 @@
+# benchmarks/telegram_stub.py
+# Локальная заглушка Telegram Bot API для нагрузочного теста: принимает запросы бота (TELEGRAM_API_URL),
+# считает запросы и загруженные байты, может добавлять задержку ответа и отвечать flood-wait (429).
+# Через getUpdates отдает боту заранее заданные нажатия кнопок, например включение мониторинга.
+#
+#   python -m benchmarks.telegram_stub --port 8081 --latency-ms 150 --flood-rate 0.05
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+# Методы, которые Telegram подтверждает просто true
+_TRUE_METHODS = {"deletewebhook", "setmycommands", "answercallbackquery", "deletemessage", "sendchataction"}
+_SEND_METHODS = {"sendmessage", "sendphoto", "sendvideo", "senddocument", "sendmediagroup"}
+
+
+def callback_update(update_id, user_id, data):
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id), "chat_instance": "stub", "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "load"},
+            "message": {"message_id": update_id, "date": int(time.time()), "text": "stub",
+                        "chat": {"id": user_id, "type": "private"}},
+        },
+    }
+
+
+class TelegramStub:
+    def __init__(self, latency=0.0, jitter=0.0, flood_rate=0.0, retry_after=1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.updates = []
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.file_ids = itertools.count(1)
+        self.requests = Counter()  # по методам
+        self.flood_waits = Counter()
+        self.upload_bytes = Counter()  # по методам
+        self.uploads = Counter()
+        self.deliveries = []  # (время, метод, чат) успешных отправок
+        self.started_at = time.monotonic()
+        self.runner = None
+
+    # Нажатие кнопки пользователем: "toggle_monitoring_on", "set_mode_video"
+    def press(self, user_id, data):
+        self.updates.append(callback_update(next(self.update_ids), user_id, data))
+
+    def _message(self, chat_id, method, form):
+        message = {"message_id": next(self.message_ids), "date": int(time.time()),
+                   "chat": {"id": int(chat_id or 0), "type": "private"}}
+        file_id = f"stub{next(self.file_ids)}"
+        if method == "sendphoto":
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480}]
+        elif method == "sendvideo":
+            message["video"] = {"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480,
+                                "duration": int(form.get("duration") or 0)}
+        elif method == "senddocument":
+            message["document"] = {"file_id": file_id, "file_unique_id": file_id}
+        else:
+            message["text"] = str(form.get("text") or form.get("caption") or "")
+        return message
+
+    async def _read_form(self, request, method):
+        if request.content_type == "application/json":
+            return await request.json(), 0
+        form = await request.post()
+        size = 0
+        for value in form.values():
+            if isinstance(value, web.FileField):
+                size += len(value.file.read())
+                self.uploads[method] += 1
+        return form, size
+
+    async def handle(self, request):
+        method = request.match_info["method"].lower()
+        form, size = await self._read_form(request, method)
+        self.requests[method] += 1
+
+        if method == "getupdates":
+            if self.updates:
+                updates, self.updates = self.updates, []
+                return web.json_response({"ok": True, "result": updates})
+            # Длинный опрос: без обновлений ответ через timeout секунд, но не дольше секунды
+            await asyncio.sleep(min(1.0, float(form.get("timeout") or 0)))
+            return web.json_response({"ok": True, "result": []})
+        if method == "getme":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "stub",
+                                                             "username": "stub_bot"}})
+        if method in _TRUE_METHODS:
+            return web.json_response({"ok": True, "result": True})
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        if method in _SEND_METHODS and self.flood_rate and self.rng.random() < self.flood_rate:
+            self.flood_waits[method] += 1
+            return web.json_response(
+                {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+                 "parameters": {"retry_after": self.retry_after}}, status=429)
+
+        self.upload_bytes[method] += size
+        chat_id = form.get("chat_id")
+        if method in _SEND_METHODS:
+            self.deliveries.append((time.monotonic(), method, chat_id))
+        if method == "sendmediagroup":
+            media = form.get("media") or "[]"
+            count = max(1, len(json.loads(media) if isinstance(media, str) else media))
+            return web.json_response({"ok": True, "result": [self._message(chat_id, "sendphoto", form)
+                                                             for _ in range(count)]})
+        return web.json_response({"ok": True, "result": self._message(chat_id, method, form)})
+
+    async def start(self, host="127.0.0.1", port=0):
+        # Видео и альбомы больше лимита aiohttp по умолчанию (1 МБ)
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.started_at = time.monotonic()
+        port = self.runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def stats(self):
+        elapsed = max(1e-9, time.monotonic() - self.started_at)
+        return {
+            "requests": dict(self.requests),
+            "delivered": len(self.deliveries),
+            "delivered_per_minute": round(len(self.deliveries) * 60 / elapsed, 1),
+            "flood_waits": dict(self.flood_waits),
+            "uploads": dict(self.uploads),
+            "upload_mb": round(sum(self.upload_bytes.values()) / (1024 * 1024), 2),
+        }
+
+
+async def _serve(args):
+    stub = TelegramStub(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, flood_rate=args.flood_rate,
+                        retry_after=args.retry_after)
+    for user_id in args.users:
+        stub.press(user_id, f"set_mode_{args.mode}")
+        stub.press(user_id, "toggle_monitoring_on")
+    url = await stub.start(args.host, args.port)
+    print(f"Заглушка Bot API: TELEGRAM_API_URL={url}")
+    try:
+        while True:
+            await asyncio.sleep(30)
+            print(stub.stats())
+    finally:
+        await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0, help="задержка ответа на отправку")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="случайная добавка к задержке")
+    parser.add_argument("--flood-rate", type=float, default=0, help="доля отправок, получающих flood-wait")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответе flood-wait (сек)")
+    parser.add_argument("--users", type=int, nargs="*", default=[], help="кто включает мониторинг при запуске")
+    parser.add_argument("--mode", choices=("photo", "video"), default="photo")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,19 @@
 # bot_handler/__init__.py
-from .bot import bot, dp, start_bot_polling, broadcast_alert
+import importlib
+
+from .aggregator import AlertAggregator
 from . import state as bot_state
+
+# aiogram импортируется несколько секунд, поэтому модуль бота загружается при первом обращении
+# к его объектам (или заранее в фоне через load_bot), а не при импорте пакета
+_BOT_EXPORTS = ("bot", "dp", "start_bot_polling", "broadcast_alert", "broadcast_album")
+
+
+def load_bot():
+    return importlib.import_module(".bot", __name__)
+
+
+def __getattr__(name):
+    if name in _BOT_EXPORTS:
+        return getattr(load_bot(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,62 @@
+# bot_handler/aggregator.py
+
+
+class _Candidate:
+    __slots__ = ("timestamp", "score", "frame", "regions")
+
+    def __init__(self, timestamp, score, frame, regions):
+        self.timestamp = timestamp
+        self.score = score
+        self.frame = frame
+        self.regions = regions
+
+
+# Площадь движения в кадре - чем больше, тем лучше кадр показывает происходящее
+def motion_score(regions):
+    return sum(w * h for _, _, w, h in regions)
+
+
+# Собирает кадры всплеска движения в окне window секунд и отдает лучшие одним альбомом.
+# Окно делится на max_items равных отрезков, в каждом хранится только кадр с наибольшей оценкой:
+# альбом покрывает весь всплеск, а в памяти не больше max_items кадров.
+# Окно 0 - отправка первого же кадра, как одиночное фото.
+class AlertAggregator:
+    def __init__(self, window=5.0, max_items=4):
+        self.window = max(0.0, window)
+        self.max_items = max(1, min(10, max_items))  # в альбоме Telegram не больше 10 файлов
+        self.started_at = None
+        self.slots = {}
+        self.bursts = 0
+        self.offered = 0
+        self.delivered = 0
+
+    @property
+    def active(self):
+        return self.started_at is not None
+
+    def add(self, timestamp, frame, regions, score=None):
+        if self.started_at is None:
+            self.started_at = timestamp
+            self.bursts += 1
+        self.offered += 1
+        score = motion_score(regions) if score is None else score
+        slot = 0
+        if self.window > 0:
+            slot = min(self.max_items - 1, int((timestamp - self.started_at) * self.max_items / self.window))
+        current = self.slots.get(slot)
+        if current is None or score > current.score:
+            self.slots[slot] = _Candidate(timestamp, score, frame, regions)
+
+    def ready(self, timestamp):
+        return self.started_at is not None and timestamp - self.started_at >= self.window
+
+    # Лучшие кадры всплеска в порядке съемки, окно закрывается
+    def take(self):
+        candidates = [self.slots[slot] for slot in sorted(self.slots)]
+        self.started_at = None
+        self.slots = {}
+        self.delivered += len(candidates)
+        return candidates
+
+    def stats(self):
+        return {"bursts": self.bursts, "frames": self.offered, "photos": self.delivered}
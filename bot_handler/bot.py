@@ -1,16 +1,30 @@
 # bot_handler/bot.py
 import asyncio
 import logging
+import os
+import re
+import time
+from datetime import datetime
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import CommandStart, Command
-from aiogram.types import Message, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.types import (
+    Message, FSInputFile, BufferedInputFile, InputMediaPhoto, InlineKeyboardMarkup, InlineKeyboardButton,
+    CallbackQuery
+)
 from aiogram.utils.markdown import hbold
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 try:
-    from config import TELEGRAM_BOT_TOKEN, ALLOWED_USER_IDS
+    from config import (
+        TELEGRAM_BOT_TOKEN, TELEGRAM_API_URL, ALLOWED_USER_IDS, CAMERA_SOURCES, ZONES_FILE, EVENTS_PAGE_SIZE,
+        PROFILE_MAX_SECONDS, PROFILE_INTERVAL_MS,
+        SEND_QUEUE_SIZE, SEND_WORKERS, SEND_CHAT_INTERVAL, SEND_GLOBAL_RATE, SEND_MAX_RETRIES
+    )
     from . import state as bot_state
+    from .sender import TelegramSendQueue
 except ModuleNotFoundError:
     import sys
     import os
@@ -19,13 +33,29 @@ except ModuleNotFoundError:
     project_root = os.path.dirname(current_dir)
     if project_root not in sys.path:
         sys.path.insert(0, project_root)
-    from config import TELEGRAM_BOT_TOKEN, ALLOWED_USER_IDS
+    from config import (
+        TELEGRAM_BOT_TOKEN, TELEGRAM_API_URL, ALLOWED_USER_IDS, CAMERA_SOURCES, ZONES_FILE, EVENTS_PAGE_SIZE,
+        PROFILE_MAX_SECONDS, PROFILE_INTERVAL_MS,
+        SEND_QUEUE_SIZE, SEND_WORKERS, SEND_CHAT_INTERVAL, SEND_GLOBAL_RATE, SEND_MAX_RETRIES
+    )
     from bot_handler import state as bot_state
+    from bot_handler.sender import TelegramSendQueue
+
+from motion_detection.zones import DetectionZones, save_zones
+from image_processing.captions import format_detected_objects
+from monitoring import REGISTRY
+from monitoring.profiler import SamplingProfiler
 
 default_bot_properties = DefaultBotProperties(parse_mode=ParseMode.HTML)
-bot = Bot(token=TELEGRAM_BOT_TOKEN, default=default_bot_properties)
+# Свой сервер Bot API - для локального telegram-bot-api или заглушки нагрузочного теста
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+bot = Bot(token=TELEGRAM_BOT_TOKEN, default=default_bot_properties, session=session)
 dp = Dispatcher()
 logger = logging.getLogger(__name__)
+_UPLOAD_BYTES = REGISTRY.counter("telegram_upload_bytes", "Загружено в Telegram байт")
+send_queue = TelegramSendQueue(queue_size=SEND_QUEUE_SIZE, workers=SEND_WORKERS,
+                               per_chat_interval=SEND_CHAT_INTERVAL, global_rate=SEND_GLOBAL_RATE,
+                               max_retries=SEND_MAX_RETRIES)
 
 
 class AccessMiddleware:
@@ -96,6 +126,195 @@ async def cmd_status(message: Message):
     await message.answer(f"Мониторинг: {status}\nРежим: {mode}")
 
 
+def _format_zones():
+    lines = []
+    for camera in range(1, len(CAMERA_SOURCES) + 1):
+        zones = bot_state.zones.get(str(camera)) or {}
+        include, exclude = zones.get("include") or [], zones.get("exclude") or []
+        if not include and not exclude:
+            lines.append(f"Камера {camera}: весь кадр")
+            continue
+        lines.append(f"Камера {camera}:")
+        for kind, polygons in (("include", include), ("exclude", exclude)):
+            for polygon in polygons:
+                points = " ".join(f"{x:g},{y:g}" for x, y in polygon)
+                lines.append(f"  {kind}: {points}")
+    return "\n".join(lines)
+
+
+@dp.message(Command("zones"))
+async def cmd_zones(message: Message):
+    await message.answer(_format_zones(), parse_mode=None)
+
+
+@dp.message(Command("zone"))
+async def cmd_zone(message: Message):
+    usage = ("Использование: /zone <камера> include|exclude x,y x,y x,y ... или /zone <камера> clear\n"
+             "Координаты - доли кадра от 0 до 1.")
+    args = (message.text or "").split()[1:]
+    if len(args) < 2 or not args[0].isdigit() or not 1 <= int(args[0]) <= len(CAMERA_SOURCES):
+        await message.answer(usage, parse_mode=None)
+        return
+
+    camera, action = args[0], args[1].lower()
+    zones = dict(bot_state.zones.get(camera) or {})
+    if action == "clear":
+        zones = {}
+    elif action in ("include", "exclude"):
+        try:
+            polygon = [tuple(float(value) for value in point.split(",")) for point in args[2:]]
+            DetectionZones(**{action: [polygon]})  # проверка координат
+        except ValueError as e:
+            await message.answer(f"Ошибка: {e}\n{usage}", parse_mode=None)
+            return
+        zones[action] = list(zones.get(action) or []) + [[list(point) for point in polygon]]
+    else:
+        await message.answer(usage, parse_mode=None)
+        return
+
+    bot_state.zones[camera] = zones
+    bot_state.zones_version += 1
+    bot_state.notify_changed()
+    try:
+        save_zones(ZONES_FILE, bot_state.zones)
+    except OSError as e:
+        logger.error(f"Не удалось сохранить зоны в {ZONES_FILE}: {e}")
+    logger.info(f"Зоны камеры {camera} изменены: {zones}")
+    await message.answer(_format_zones(), parse_mode=None)
+
+
+_RELATIVE_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+# "30m", "6h", "2d" - давность; "22:00" - сегодня (или вчера, если время еще не наступило);
+# "2026-10-17" и "2026-10-17 22:00" - дата и время
+def _parse_since(text, now=None):
+    now = time.time() if now is None else now
+    text = text.strip()
+    match = re.fullmatch(r"(\d+)\s*([mhd])", text.lower())
+    if match:
+        return now - int(match.group(1)) * _RELATIVE_UNITS[match.group(2)]
+    for pattern in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, pattern).timestamp()
+        except ValueError:
+            pass
+    moment = datetime.strptime(text, "%H:%M")
+    today = datetime.fromtimestamp(now).replace(hour=moment.hour, minute=moment.minute, second=0, microsecond=0)
+    since = today.timestamp()
+    return since if since <= now else since - 86400
+
+
+def _format_event(event):
+    moment = datetime.fromtimestamp(event["ts"]).strftime("%d.%m %H:%M:%S")
+    camera = f" [Камера {event['camera']}]" if len(CAMERA_SOURCES) > 1 else ""
+    kind = "📹" if event["kind"] == "video" else "🚨"
+    objects = format_detected_objects(event["objects"])
+    files = ", ".join(os.path.basename(path) for path in event["media"]) or "файлы не сохранены"
+    return f"{kind} {moment}{camera} - {objects} Площадь движения: {event['motion_area']}. {files}"
+
+
+# Страница журнала: since - начало периода (0 - весь журнал), before_id - курсор предыдущей страницы
+async def _events_page(since, before_id=None):
+    started = time.perf_counter()
+    events = await asyncio.to_thread(bot_state.events.query, since=since or None, before_id=before_id,
+                                     limit=EVENTS_PAGE_SIZE + 1)
+    logger.debug(f"Запрос журнала событий: {(time.perf_counter() - started) * 1000:.1f} мс")
+    has_more = len(events) > EVENTS_PAGE_SIZE
+    events = events[:EVENTS_PAGE_SIZE]
+    if not events:
+        return "Событий нет.", None
+    text = "\n".join(_format_event(event) for event in events)
+    keyboard = None
+    if has_more:
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+            text="Дальше", callback_data=f"events_{int(since or 0)}_{events[-1]['id']}")]])
+    return text, keyboard
+
+
+@dp.message(Command("stats"))
+async def cmd_stats(message: Message):
+    if not REGISTRY.enabled:
+        await message.answer("Метрики отключены (METRICS_ENABLED).")
+        return
+    lines = await asyncio.to_thread(REGISTRY.summary)
+    text = "\n".join(lines) or "Метрик пока нет."
+    # Ограничение Telegram - 4096 символов на сообщение
+    await message.answer(text[:4000], parse_mode=None)
+
+
+# Профиль снимается в отдельном потоке, основной цикл и детекция продолжают работать.
+# Доступ, как и к остальным командам, только у ALLOWED_USER_IDS (AccessMiddleware).
+@dp.message(Command("profile"))
+async def cmd_profile(message: Message):
+    usage = f"Использование: /profile <секунды от 1 до {PROFILE_MAX_SECONDS}>"
+    args = (message.text or "").split()[1:]
+    try:
+        seconds = float(args[0]) if args else 10.0
+    except ValueError:
+        seconds = 0
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        await message.answer(usage)
+        return
+    if SamplingProfiler.busy():
+        await message.answer("Профилирование уже идет, дождитесь отчета.")
+        return
+
+    await message.answer(f"Профилирование на {seconds:g} сек...")
+    logger.info(f"Профилирование на {seconds:g} сек запрошено пользователем {message.from_user.id}")
+    profiler = SamplingProfiler(interval=PROFILE_INTERVAL_MS / 1000)
+    try:
+        report = await asyncio.to_thread(profiler.run, seconds)
+    except RuntimeError as e:
+        await message.answer(str(e))
+        return
+    filename = f"profile_{datetime.now():%Y%m%d_%H%M%S}.txt"
+    await message.answer_document(BufferedInputFile(report.encode("utf-8"), filename=filename),
+                                  caption=f"Профиль за {seconds:g} сек, выборок {profiler.samples}")
+
+
+@dp.message(Command("history"))
+async def cmd_history(message: Message):
+    if bot_state.events is None:
+        await message.answer("Журнал событий недоступен.")
+        return
+    text, keyboard = await _events_page(None)
+    await message.answer(text, reply_markup=keyboard, parse_mode=None)
+
+
+@dp.message(Command("events"))
+async def cmd_events(message: Message):
+    usage = "Использование: /events <с какого момента>, например /events 22:00, /events 2026-10-17, /events 6h"
+    if bot_state.events is None:
+        await message.answer("Журнал событий недоступен.")
+        return
+    args = (message.text or "").split(maxsplit=1)[1:]
+    if args and args[0].lower().startswith("since "):
+        args = [args[0][len("since "):]]
+    try:
+        since = _parse_since(args[0]) if args else None
+    except ValueError:
+        since = None
+    if since is None:
+        await message.answer(usage, parse_mode=None)
+        return
+    total = await asyncio.to_thread(bot_state.events.count, since)
+    text, keyboard = await _events_page(since)
+    header = f"С {datetime.fromtimestamp(since).strftime('%d.%m %H:%M')}: событий {total}\n"
+    await message.answer(header + text, reply_markup=keyboard, parse_mode=None)
+
+
+@dp.callback_query(F.data.startswith("events_"))
+async def cq_events_page(callback: CallbackQuery):
+    if bot_state.events is None:
+        await callback.answer("Журнал событий недоступен.")
+        return
+    _, since, before_id = callback.data.split("_")
+    text, keyboard = await _events_page(int(since), int(before_id))
+    await callback.message.answer(text, reply_markup=keyboard, parse_mode=None)
+    await callback.answer()
+
+
 @dp.callback_query(F.data.startswith("toggle_monitoring_"))
 async def cq_toggle_monitoring(callback: CallbackQuery):
     action = callback.data.split("_")[-1]
@@ -105,6 +324,7 @@ async def cq_toggle_monitoring(callback: CallbackQuery):
     elif action == "off":
         bot_state.monitoring_active = False
         logger.info("Мониторинг выключен пользователем")
+    bot_state.notify_changed()
 
     await callback.message.edit_text(
         f"Состояние мониторинга: {hbold('ВКЛЮЧЕН') if bot_state.monitoring_active else hbold('ВЫКЛЮЧЕН')}\n"
@@ -126,6 +346,7 @@ async def cq_set_mode(callback: CallbackQuery):
         return
 
     bot_state.current_mode = new_mode
+    bot_state.notify_changed()
     logger.info(f"Режим изменен на: {new_mode}")
 
     await callback.message.edit_text(
@@ -136,31 +357,138 @@ async def cq_set_mode(callback: CallbackQuery):
     await callback.answer(f"Режим: {new_mode}")
 
 
-async def send_alert_to_user(user_id: int, message_text: str, file_path: str = None, file_type: str = "photo"):
-    try:
-        if file_path:
-            input_file = FSInputFile(file_path)
-            if file_type == "photo":
-                await bot.send_photo(chat_id=user_id, photo=input_file, caption=message_text)
-            elif file_type == "video":
-                await bot.send_video(chat_id=user_id, video=input_file, caption=message_text, supports_streaming=True)
+def _make_alert_request(user_id: int, message_text: str, file_path: str = None, file_id: str = None,
+                        file_type: str = "photo", file_data: bytes = None, filename: str = None,
+                        video_info: dict = None):
+    def make_request():
+        # file_id уже загруженного файла пересылается без повторной загрузки,
+        # закодированный в памяти кадр отправляется без чтения с диска
+        if file_id:
+            media = file_id
+        elif file_data is not None:
+            media = BufferedInputFile(file_data, filename=filename or "alert.jpg")
         else:
-            await bot.send_message(chat_id=user_id, text=message_text)
-        logger.info(f"Оповещение ({file_type if file_path else 'text'}) отправлено пользователю {user_id}")
+            media = FSInputFile(file_path) if file_path else None
+        if media is None:
+            return bot.send_message(chat_id=user_id, text=message_text)
+        if file_type == "photo":
+            return bot.send_photo(chat_id=user_id, photo=media, caption=message_text)
+        # Размеры, длительность и миниатюра нужны только при загрузке, по file_id Telegram их уже знает
+        extra = {}
+        if video_info and not file_id:
+            extra = {key: video_info[key] for key in ("width", "height", "duration") if video_info.get(key)}
+            if video_info.get("thumbnail"):
+                extra["thumbnail"] = FSInputFile(video_info["thumbnail"])
+        return bot.send_video(chat_id=user_id, video=media, caption=message_text, supports_streaming=True, **extra)
+    return make_request
+
+
+def _extract_file_id(message, file_type: str):
+    if message is None:
+        return None
+    if file_type == "photo" and message.photo:
+        return message.photo[-1].file_id
+    if file_type == "video" and message.video:
+        return message.video.file_id
+    return None
+
+
+async def send_alert_to_user(user_id: int, message_text: str, file_path: str = None, file_type: str = "photo",
+                             file_id: str = None, file_data: bytes = None, filename: str = None,
+                             video_info: dict = None):
+    has_file = bool(file_path or file_id or file_data is not None)
+    try:
+        size = 0
+        if has_file and not file_id:
+            size = len(file_data) if file_data is not None else os.path.getsize(file_path)
+        message = await send_queue.send(user_id, _make_alert_request(user_id, message_text, file_path, file_id,
+                                                                     file_type, file_data, filename, video_info),
+                                        kind=file_type if has_file else "message")
+        # Считаются только доставленные загрузки: неудачные попытки и повторы не в счет
+        if size:
+            _UPLOAD_BYTES.labels(kind=file_type).inc(size)
+        logger.info(f"Оповещение ({file_type if has_file else 'text'}) отправлено пользователю {user_id}")
+        return message
     except Exception as e:
         logger.error(f"Ошибка при отправке оповещения ({file_type}) пользователю {user_id}: {e}", exc_info=True)
+        return None
 
 
-async def broadcast_alert(message_text: str, file_path: str = None, file_type: str = "photo"):
+async def broadcast_alert(message_text: str, file_path: str = None, file_type: str = "photo",
+                          file_data: bytes = None, filename: str = None, video_info: dict = None):
     logger.info(f"Начало рассылки оповещения: {message_text[:50]}...")
+    recipients = list(ALLOWED_USER_IDS)
+    file_id = None
+    if file_path or file_data is not None:
+        # Файл загружается один раз: первому получателю, дальше рассылается его file_id
+        while recipients and file_id is None:
+            user_id = recipients.pop(0)
+            message = await send_alert_to_user(user_id, message_text, file_path, file_type,
+                                               file_data=file_data, filename=filename, video_info=video_info)
+            file_id = _extract_file_id(message, file_type)
+        if file_id is None:
+            logger.error(f"Не удалось загрузить файл {file_path or filename} ни одному получателю.")
+            return
+
     tasks = []
-    for user_id in ALLOWED_USER_IDS:
-        tasks.append(send_alert_to_user(user_id, message_text, file_path, file_type))
+    for user_id in recipients:
+        tasks.append(send_alert_to_user(user_id, message_text, file_type=file_type, file_id=file_id))
 
     results = await asyncio.gather(*tasks, return_exceptions=True)
-    for i, result in enumerate(results):
+    for user_id, result in zip(recipients, results):
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка при отправке пользователю {user_id}: {result}")
+
+
+def _make_album_request(user_id: int, message_text: str, photos: list = None, file_ids: list = None):
+    def make_request():
+        # Подпись у первого файла - Telegram показывает ее под всем альбомом
+        sources = file_ids or [BufferedInputFile(data, filename=name) for name, data in photos]
+        media = [InputMediaPhoto(media=source, caption=message_text if index == 0 else None)
+                 for index, source in enumerate(sources)]
+        return bot.send_media_group(chat_id=user_id, media=media)
+    return make_request
+
+
+async def send_album_to_user(user_id: int, message_text: str, photos: list = None, file_ids: list = None):
+    try:
+        messages = await send_queue.send(user_id, _make_album_request(user_id, message_text, photos, file_ids),
+                                         kind="album")
+        if photos:
+            _UPLOAD_BYTES.labels(kind="album").inc(sum(len(data) for _, data in photos))
+        logger.info(f"Альбом ({len(photos or file_ids)} фото) отправлен пользователю {user_id}")
+        return messages
+    except Exception as e:
+        logger.error(f"Ошибка при отправке альбома пользователю {user_id}: {e}", exc_info=True)
+        return None
+
+
+# photos - список (имя файла, байты JPEG). Альбом - один запрос на получателя вместо запроса на каждое фото.
+async def broadcast_album(message_text: str, photos: list):
+    if len(photos) == 1:
+        name, data = photos[0]
+        await broadcast_alert(message_text, file_data=data, filename=name)
+        return
+    logger.info(f"Начало рассылки альбома ({len(photos)} фото): {message_text[:50]}...")
+    recipients = list(ALLOWED_USER_IDS)
+    file_ids = None
+    # Как и одиночные файлы, альбом загружается один раз, остальным уходят file_id
+    while recipients and file_ids is None:
+        user_id = recipients.pop(0)
+        messages = await send_album_to_user(user_id, message_text, photos=photos)
+        if messages:
+            file_ids = [_extract_file_id(message, "photo") for message in messages]
+            if None in file_ids:
+                file_ids = None
+    if file_ids is None:
+        logger.error("Не удалось загрузить альбом ни одному получателю.")
+        return
+
+    results = await asyncio.gather(*(send_album_to_user(user_id, message_text, file_ids=file_ids)
+                                     for user_id in recipients), return_exceptions=True)
+    for user_id, result in zip(recipients, results):
         if isinstance(result, Exception):
-            logger.error(f"Ошибка при отправке пользователю {ALLOWED_USER_IDS[i]}: {result}")
+            logger.error(f"Ошибка при отправке альбома пользователю {user_id}: {result}")
 
 
 async def start_bot_polling():
@@ -172,4 +500,5 @@ async def start_bot_polling():
         logger.critical(f"Критическая ошибка при запуске polling: {e}", exc_info=True)
     finally:
         logger.info("Polling остановлен.")
+        await send_queue.stop()
         await bot.session.close()
@@ -0,0 +1,144 @@
+# bot_handler/sender.py
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from monitoring import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_SECONDS = REGISTRY.histogram("telegram_request_seconds", "Длительность запроса к Telegram API")
+_REQUESTS = REGISTRY.counter("telegram_requests", "Запросов к Telegram API по результату")
+_FLOOD_WAITS = REGISTRY.counter("telegram_flood_waits", "Ответов flood-wait от Telegram")
+_QUEUE_WAIT_SECONDS = REGISTRY.histogram("telegram_queue_wait_seconds", "Ожидание в очереди отправки")
+_SEND_QUEUE = REGISTRY.gauge("telegram_queue_depth", "Запросов в очереди отправки")
+
+
+class _SendJob:
+    __slots__ = ("chat_id", "make_request", "future", "attempts", "kind", "queued_at")
+
+    def __init__(self, chat_id, make_request, future, kind="message"):
+        self.chat_id = chat_id
+        self.make_request = make_request
+        self.future = future
+        self.attempts = 0
+        self.kind = kind
+        self.queued_at = time.monotonic()
+
+
+# Ограниченная очередь отправки в Telegram.
+# Выдерживает паузу между сообщениями в один чат и общий темп запросов,
+# при flood-wait (TelegramRetryAfter) ждет указанное время и повторяет запрос.
+class TelegramSendQueue:
+    def __init__(self, queue_size=100, workers=4, per_chat_interval=1.0, global_rate=25, max_retries=3):
+        self.queue_size = queue_size
+        self.workers = max(1, workers)
+        self.per_chat_interval = per_chat_interval
+        self.global_interval = 1.0 / global_rate if global_rate > 0 else 0
+        self.max_retries = max_retries
+        self.queue = None
+        self.tasks = []
+        self.chat_locks = {}
+        self.chat_next_time = {}
+        self.global_lock = None
+        self.global_next_time = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.flood_waits = 0
+        _SEND_QUEUE.set_function(lambda: self.queue_depth)
+
+    def _ensure_started(self):
+        if self.queue is not None:
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.global_lock = asyncio.Lock()
+        for i in range(self.workers):
+            self.tasks.append(asyncio.create_task(self._worker(), name=f"telegram-sender-{i}"))
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    # make_request - функция без аргументов, возвращающая корутину запроса к API.
+    # Вызывается заново при каждой попытке, поэтому файлы открываются повторно.
+    # kind - тип запроса для метрик (message, photo, video, album)
+    async def send(self, chat_id, make_request, kind="message"):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(_SendJob(chat_id, make_request, future, kind))
+        return await future
+
+    async def _wait_turn(self, chat_id):
+        now = time.monotonic()
+        delay = self.chat_next_time.get(chat_id, 0.0) - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with self.global_lock:
+            delay = self.global_next_time - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.global_next_time = time.monotonic() + self.global_interval
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._process(job)
+            except asyncio.CancelledError:
+                # Остановка очереди: задание в работе не должно навсегда оставить ждать отправителя
+                job.future.cancel()
+                raise
+            finally:
+                self.queue.task_done()
+
+    async def _process(self, job):
+        # Сообщения в один чат уходят строго по очереди
+        lock = self.chat_locks.setdefault(job.chat_id, asyncio.Lock())
+        async with lock:
+            while True:
+                job.attempts += 1
+                await self._wait_turn(job.chat_id)
+                if job.attempts == 1:
+                    _QUEUE_WAIT_SECONDS.observe(time.monotonic() - job.queued_at)
+                started = time.perf_counter()
+                try:
+                    result = await job.make_request()
+                    _REQUEST_SECONDS.labels(kind=job.kind).observe(time.perf_counter() - started)
+                    _REQUESTS.labels(kind=job.kind, result="ok").inc()
+                    self.chat_next_time[job.chat_id] = time.monotonic() + self.per_chat_interval
+                    self.sent += 1
+                    if not job.future.done():
+                        job.future.set_result(result)
+                    return
+                except TelegramRetryAfter as e:
+                    self.flood_waits += 1
+                    _FLOOD_WAITS.inc()
+                    self.chat_next_time[job.chat_id] = time.monotonic() + e.retry_after
+                    logger.warning(f"Flood-wait для чата {job.chat_id}: ждем {e.retry_after} сек.")
+                    error = e
+                except (TelegramNetworkError, TelegramServerError) as e:
+                    self.chat_next_time[job.chat_id] = time.monotonic() + min(2 ** job.attempts, 30)
+                    logger.warning(f"Сетевая ошибка при отправке в чат {job.chat_id}: {e}")
+                    error = e
+                except Exception as e:
+                    error = e
+                    job.attempts = self.max_retries + 1
+
+                if job.attempts > self.max_retries:
+                    self.failed += 1
+                    _REQUESTS.labels(kind=job.kind, result="failed").inc()
+                    if not job.future.done():
+                        job.future.set_exception(error)
+                    return
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.queue is not None:
+            while not self.queue.empty():
+                self.queue.get_nowait().future.cancel()
+        self.queue = None
@@ -1,4 +1,18 @@
 # bot_handler/state.py
+import asyncio
+
 monitoring_active = False
 current_mode = "photo"
+# Зоны детекции по номерам камер; версия растет при каждом изменении через бота
+zones = {}
+zones_version = 0
+# Журнал событий (storage.EventIndex), задается основным циклом
+events = None
+
+# Выставляется ботом при смене состояния, чтобы основной цикл не опрашивал его
+state_changed = asyncio.Event()
+
+
+def notify_changed():
+    state_changed.set()
 
@@ -5,16 +5,93 @@ load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 ALLOWED_USER_IDS = [int(uid) for uid in os.getenv("ALLOWED_USER_IDS", "").split(",") if uid.strip()]
+# Адрес сервера Bot API (пусто - api.telegram.org): свой telegram-bot-api или заглушка нагрузочного теста
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Источники через запятую: индексы камер или URL/пути к потокам. Несколько камер - по процессу на каждую
+CAMERA_SOURCES = [int(src) if src.strip().isdigit() else src.strip()
+                  for src in os.getenv("CAMERA_SOURCES", "0").split(",") if src.strip()]
 
 MIN_CONTOUR_AREA = int(os.getenv("MIN_CONTOUR_AREA", 1000))
 FRAME_WIDTH = int(os.getenv("FRAME_WIDTH", 640))
 FRAME_HEIGHT = int(os.getenv("FRAME_HEIGHT", 480))
+CAPTURE_BUFFER_SIZE = int(os.getenv("CAPTURE_BUFFER_SIZE", 4))
+# Зоны детекции в JSON: {"1": {"include": [[[x, y], ...]], "exclude": [...]}}, координаты в долях кадра.
+# Зоны, измененные через бота, сохраняются в ZONES_FILE и при запуске важнее DETECTION_ZONES
+DETECTION_ZONES = os.getenv("DETECTION_ZONES", "")
+ZONES_FILE = os.getenv("ZONES_FILE", "zones.json")
+# "full" - всегда полный анализ контуров, "tiered" - сначала грубый проход по уменьшенному кадру,
+# полный анализ - только если изменилось не меньше половины MIN_CONTOUR_AREA. Tiered включается явно:
+# на мелком или слабоконтрастном движении он может срабатывать иначе, чем full
+MOTION_DETECTION_MODE = os.getenv("MOTION_DETECTION_MODE", "full").strip().lower()
+MOTION_DOWNSCALE = int(os.getenv("MOTION_DOWNSCALE", 4))
+# Модель фона: frame - сравнение с предыдущим кадром, average - скользящее среднее, mog2 - смесь гауссиан
+MOTION_BACKGROUND = os.getenv("MOTION_BACKGROUND", "frame").strip().lower()
+MOTION_LEARNING_RATE = float(os.getenv("MOTION_LEARNING_RATE", 0.05))
+# Частота анализа кадров в тихой сцене и при движении (0 - каждый кадр камеры),
+# сколько секунд держать высокую частоту после движения и период отчета о загрузке
+SCHEDULER_IDLE_FPS = float(os.getenv("SCHEDULER_IDLE_FPS", 2))
+SCHEDULER_ACTIVE_FPS = float(os.getenv("SCHEDULER_ACTIVE_FPS", 0))
+SCHEDULER_HOLD_SECONDS = float(os.getenv("SCHEDULER_HOLD_SECONDS", 5))
+SCHEDULER_STATS_INTERVAL = int(os.getenv("SCHEDULER_STATS_INTERVAL", 60))
 
 PHOTO_COOLDOWN_PERIOD = int(os.getenv("PHOTO_COOLDOWN_PERIOD", 30))
+# Фото режим: окно сбора кадров всплеска (сек, 0 - одно фото сразу) и число лучших кадров в альбоме (до 10)
+ALERT_WINDOW = float(os.getenv("ALERT_WINDOW", 5))
+ALERT_ALBUM_SIZE = int(os.getenv("ALERT_ALBUM_SIZE", 4))
 VIDEO_FPS = int(os.getenv("VIDEO_FPS", 15))
+VIDEO_QUEUE_SIZE = int(os.getenv("VIDEO_QUEUE_SIZE", 64))
 VIDEO_NO_MOTION_STOP_DELAY = int(os.getenv("VIDEO_NO_MOTION_STOP_DELAY", 5))
+# Длина части видео (сек): готовые части отправляются, пока запись идет. 0 - один файл на событие
+VIDEO_SEGMENT_SECONDS = float(os.getenv("VIDEO_SEGMENT_SECONDS", 20))
+# Сжатая копия видео для отправки (ffmpeg/libx264, без ffmpeg - OpenCV): процессов перекодирования
+# (0 - отправлять оригинал), ширина, битрейт, предельный размер копии и ширина миниатюры
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", 1))
+TRANSCODE_WIDTH = int(os.getenv("TRANSCODE_WIDTH", 640))
+TRANSCODE_BITRATE_KBPS = int(os.getenv("TRANSCODE_BITRATE_KBPS", 600))
+TRANSCODE_TARGET_MB = float(os.getenv("TRANSCODE_TARGET_MB", 8))
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", 320))
+# Сколько секунд до движения добавлять в начало видео (0 - выключено) и лимит памяти буфера
+PREROLL_SECONDS = float(os.getenv("PREROLL_SECONDS", 3))
+PREROLL_MAX_MB = float(os.getenv("PREROLL_MAX_MB", 16))
+
+IDENTIFY_WORKERS = int(os.getenv("IDENTIFY_WORKERS", 2))
+IDENTIFY_QUEUE_SIZE = int(os.getenv("IDENTIFY_QUEUE_SIZE", 4))
+# Запас вокруг рамки движения при распознавании (доля размера рамки) и кеш меток по перцептивному хешу
+IDENTIFY_REGION_PADDING = float(os.getenv("IDENTIFY_REGION_PADDING", 0.25))
+IDENTIFY_CACHE_SIZE = int(os.getenv("IDENTIFY_CACHE_SIZE", 256))
+IDENTIFY_CACHE_TTL = float(os.getenv("IDENTIFY_CACHE_TTL", 300))
+# Распознавание ключевых кадров во время видеозаписи: бюджет (сек распознавания на сек записи, 0 - только
+# первый кадр), интервал между ключевыми кадрами (сек) и изменение площади движения (доля), дающее внеочередной кадр
+VIDEO_IDENTIFY_BUDGET = float(os.getenv("VIDEO_IDENTIFY_BUDGET", 0.25))
+VIDEO_IDENTIFY_INTERVAL = float(os.getenv("VIDEO_IDENTIFY_INTERVAL", 3))
+VIDEO_IDENTIFY_AREA_CHANGE = float(os.getenv("VIDEO_IDENTIFY_AREA_CHANGE", 0.5))
 
 VIDEO_RECORD_PATH = os.getenv("VIDEO_RECORD_PATH", "motion_videos")
 SCREENSHOT_DIR = os.getenv("SCREENSHOT_DIR", "motion_screenshots")
+# Сохранять ли скриншоты оповещений на диск (в Telegram они отправляются из памяти)
+KEEP_SCREENSHOTS = os.getenv("KEEP_SCREENSHOTS", "true").lower() in ("1", "true", "yes")
+
+# Очередь отправки в Telegram: пауза между сообщениями в один чат (сек) и общий лимит запросов в секунду
+SEND_QUEUE_SIZE = int(os.getenv("SEND_QUEUE_SIZE", 100))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", 4))
+SEND_CHAT_INTERVAL = float(os.getenv("SEND_CHAT_INTERVAL", 1.0))
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 25))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 3))
 
 MAX_STORAGE_MB = int(os.getenv("MAX_STORAGE_MB", 500))
+# Отдельные квоты по типам медиа, по умолчанию - поровну от MAX_STORAGE_MB
+PHOTO_STORAGE_MB = float(os.getenv("PHOTO_STORAGE_MB", MAX_STORAGE_MB / 2))
+VIDEO_STORAGE_MB = float(os.getenv("VIDEO_STORAGE_MB", MAX_STORAGE_MB / 2))
+# Журнал событий движения (SQLite): файл базы, срок хранения записей (дней, 0 - без срока)
+# и число событий на странице /history и /events
+EVENTS_DB = os.getenv("EVENTS_DB", "events.db")
+EVENTS_RETENTION_DAYS = int(os.getenv("EVENTS_RETENTION_DAYS", 30))
+EVENTS_PAGE_SIZE = int(os.getenv("EVENTS_PAGE_SIZE", 10))
+# Метрики этапов обработки (/stats в боте) и HTTP-адрес /metrics для Prometheus (порт 0 - без HTTP)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9102))
+# /profile: предельная длительность окна (сек) и интервал выборок стеков (мс)
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 120))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 10))
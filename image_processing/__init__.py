@@ -1 +1,5 @@
-from .identifier import ObjectIdentifier
\ No newline at end of file
+from .identifier import ObjectIdentifier
+from .service import IdentificationService
+from .cache import RegionLabelCache
+from .captions import format_detected_objects, merge_detected_objects
+from .sampler import KeyframeSampler
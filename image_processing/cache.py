@@ -0,0 +1,65 @@
+# image_processing/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+# Разностный перцептивный хеш (dHash): 64 бита, устойчив к шуму, сжатию и небольшим сдвигам
+def perceptual_hash(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+# LRU-кеш меток распознавания по перцептивному хешу области кадра.
+# Почти одинаковые области (расстояние Хэмминга до max_distance) получают метку из кеша,
+# записи старше ttl секунд вытесняются. Общий для всех потоков распознавания.
+class RegionLabelCache:
+    def __init__(self, max_entries=256, ttl=300, max_distance=4):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = OrderedDict()  # хеш -> (время записи, метка)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expire(self, now):
+        for key in [key for key, (stored_at, _) in self.entries.items() if now - stored_at > self.ttl]:
+            del self.entries[key]
+
+    def get(self, image_hash):
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            key = image_hash if image_hash in self.entries else None
+            if key is None and self.max_distance > 0:
+                key = next((candidate for candidate in reversed(self.entries)
+                            if (candidate ^ image_hash).bit_count() <= self.max_distance), None)
+            if key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][1]
+
+    def put(self, image_hash, label):
+        with self.lock:
+            self.entries.pop(image_hash, None)
+            self.entries[image_hash] = (time.monotonic(), label)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
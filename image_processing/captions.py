@@ -0,0 +1,23 @@
+# image_processing/captions.py
+from collections import Counter
+
+
+def format_detected_objects(detected_list):
+    if not detected_list or detected_list == ["неизвестный объект"] or detected_list == ["ошибка идентификации"]:
+        return "Объекты не идентифицированы."
+
+    counts = Counter(detected_list)
+    parts = []
+    for item, count in counts.items():
+        parts.append(f"{item}: {count}")
+    return "В кадре: " + ", ".join(parts) + "."
+
+
+# Объекты нескольких кадров одного всплеска: один человек виден на всех кадрах, поэтому
+# для каждой метки берется наибольшее число на одном кадре, а не сумма
+def merge_detected_objects(detected_lists):
+    merged = Counter()
+    for detected_list in detected_lists:
+        if detected_list and detected_list not in (["неизвестный объект"], ["ошибка идентификации"]):
+            merged |= Counter(detected_list)
+    return list(merged.elements())
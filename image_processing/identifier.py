@@ -1,24 +1,45 @@
+import threading
+
 import cv2
 import numpy as np
 
-try:
-    import mediapipe as mp
-    if hasattr(mp, 'solutions'):
-        _mp_face = mp.solutions.face_detection
-        MEDIAPIPE_AVAILABLE = True
-    else:
-        MEDIAPIPE_AVAILABLE = False
-except ImportError:
-    MEDIAPIPE_AVAILABLE = False
+from .cache import perceptual_hash
+
+_mp_face = None
+_mp_lock = threading.Lock()
+MEDIAPIPE_AVAILABLE = None  # неизвестно, пока MediaPipe не загружен
+
+
+# MediaPipe импортируется больше секунды, поэтому только при создании первого распознавателя
+# (в потоке распознавания), а не при импорте пакета: захват и детекция стартуют без ожидания модели
+def _load_mediapipe():
+    global _mp_face, MEDIAPIPE_AVAILABLE
+    with _mp_lock:
+        if MEDIAPIPE_AVAILABLE is None:
+            try:
+                import mediapipe as mp
+                MEDIAPIPE_AVAILABLE = hasattr(mp, 'solutions')
+                if MEDIAPIPE_AVAILABLE:
+                    _mp_face = mp.solutions.face_detection
+            except ImportError:
+                MEDIAPIPE_AVAILABLE = False
+            except Exception as e:
+                # Сломанная установка (не та версия protobuf и т.п.) - работаем без модели
+                print(f"Ошибка загрузки MediaPipe: {e}")
+                MEDIAPIPE_AVAILABLE = False
+        return MEDIAPIPE_AVAILABLE
 
 
 class ObjectIdentifier:
-    def __init__(self):
+    def __init__(self, cache=None, region_padding=0.25, max_regions=4):
         self.person_label = "человек"
         self.unknown_label = "движение"
         self.detector = None
+        self.cache = cache  # RegionLabelCache, может быть общим для нескольких экземпляров
+        self.region_padding = region_padding
+        self.max_regions = max_regions
 
-        if MEDIAPIPE_AVAILABLE:
+        if _load_mediapipe():
             try:
                 self.detector = _mp_face.FaceDetection(
                     model_selection=1,
@@ -27,7 +48,59 @@ class ObjectIdentifier:
             except Exception as e:
                 print(f"Ошибка инициализации MediaPipe: {e}")
 
-    def identify_objects(self, image_path=None, frame_data=None):
+    def _classify(self, image):
+        try:
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            results = self.detector.process(image_rgb)
+            if results.detections:
+                return self.person_label
+        except Exception:
+            pass
+        return self.unknown_label
+
+    # Соседние рамки (например, передний и задний край движущегося объекта) сливаются в одну,
+    # если общая рамка не больше чем вдвое превышает их суммарную площадь: одна модель вместо двух
+    @staticmethod
+    def _merge_regions(regions, ratio=2.0):
+        boxes = [tuple(box) for box in regions]
+        merged = True
+        while merged and len(boxes) > 1:
+            merged = False
+            for i in range(len(boxes)):
+                for j in range(i + 1, len(boxes)):
+                    ax, ay, aw, ah = boxes[i]
+                    bx, by, bw, bh = boxes[j]
+                    x, y = min(ax, bx), min(ay, by)
+                    w, h = max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y
+                    if w * h <= ratio * (aw * ah + bw * bh):
+                        boxes[i] = (x, y, w, h)
+                        del boxes[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return boxes
+
+    def _crop_region(self, frame, box):
+        # Область движения с запасом по краям: лицо может выходить за контур изменившихся пикселей
+        x, y, w, h = box
+        pad_x = max(16, int(w * self.region_padding))
+        pad_y = max(16, int(h * self.region_padding))
+        height, width = frame.shape[:2]
+        return frame[max(0, y - pad_y):min(height, y + h + pad_y), max(0, x - pad_x):min(width, x + w + pad_x)]
+
+    def _classify_cached(self, image):
+        if self.cache is None:
+            return self._classify(image)
+        image_hash = perceptual_hash(image)
+        label = self.cache.get(image_hash)
+        if label is None:
+            label = self._classify(image)
+            self.cache.put(image_hash, label)
+        return label
+
+    # regions - рамки движения (x, y, w, h) из детектора: модель получает только их окрестности
+    def identify_objects(self, image_path=None, frame_data=None, regions=None):
         if frame_data is not None:
             frame = frame_data
         elif image_path is not None:
@@ -38,15 +111,17 @@ class ObjectIdentifier:
         if frame is None or not self.detector:
             return [self.unknown_label]
 
-        try:
-            image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.detector.process(image_rgb)
-            if results.detections:
-                return [self.person_label]
-        except Exception:
-            pass
+        if not regions:
+            return [self._classify_cached(frame)]
 
-        return [self.unknown_label]
+        largest = sorted(self._merge_regions(regions), key=lambda box: box[2] * box[3],
+                         reverse=True)[:self.max_regions]
+        labels = []
+        for box in largest:
+            crop = self._crop_region(frame, box)
+            if crop.size:
+                labels.append(self._classify_cached(crop))
+        return labels or [self.unknown_label]
 
     def close(self):
         if self.detector and hasattr(self.detector, 'close'):
@@ -0,0 +1,51 @@
+# image_processing/sampler.py
+
+
+# Выбирает ключевые кадры для распознавания во время видеозаписи.
+# Кадр берется, когда площадь движения изменилась не меньше чем на area_change (доля) от прошлого
+# ключевого кадра или прошло interval секунд. Расход ограничен бюджетом: budget секунд распознавания
+# на секунду записи (0.25 - четверть одного ядра). Бюджет копится как в ведре с жетонами,
+# не больше чем на burst секунд вперед, и списывается по средней длительности распознавания.
+class KeyframeSampler:
+    def __init__(self, budget=0.25, interval=2.0, area_change=0.5, burst=4.0):
+        self.budget = max(0.0, budget)
+        self.interval = interval
+        self.area_change = area_change
+        self.burst = max(1.0, burst)
+        self.tokens = 0.0
+        self.last_time = None
+        self.last_sample_time = None
+        self.last_area = 0
+        self.sampled = 0
+        self.over_budget = 0
+
+    # Начало записи: первый кадр распознается всегда и бюджет не тратит
+    def reset(self, timestamp, area):
+        self.tokens = 0.0
+        self.last_time = timestamp
+        self.last_sample_time = timestamp
+        self.last_area = area
+
+    def offer(self, timestamp, area, cost):
+        if self.budget <= 0 or self.last_time is None:
+            return False
+        # Ведро вмещает хотя бы одно распознавание, иначе при долгой модели кадр не взять никогда
+        capacity = max(self.budget * self.burst, cost)
+        self.tokens = min(capacity, self.tokens + max(0.0, timestamp - self.last_time) * self.budget)
+        self.last_time = timestamp
+
+        changed = self.area_change > 0 and abs(area - self.last_area) >= self.area_change * max(1, self.last_area)
+        due = self.interval > 0 and timestamp - self.last_sample_time >= self.interval
+        if not (changed or due):
+            return False
+        if self.tokens < cost:
+            self.over_budget += 1
+            return False
+        self.tokens -= cost
+        self.last_sample_time = timestamp
+        self.last_area = area
+        self.sampled += 1
+        return True
+
+    def stats(self):
+        return {"keyframes": self.sampled, "over_budget": self.over_budget}
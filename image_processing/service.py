@@ -0,0 +1,191 @@
+# image_processing/service.py
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from .identifier import ObjectIdentifier
+from monitoring import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFY_SECONDS = REGISTRY.histogram("identify_seconds", "Время распознавания объектов на кадре")
+_IDENTIFY_DROPPED = REGISTRY.counter("identify_dropped", "Заданий распознавания вытеснено из очереди")
+_IDENTIFY_QUEUE = REGISTRY.gauge("identify_queue_depth", "Заданий в очереди распознавания")
+
+
+class _IdentificationJob:
+    __slots__ = ("loop", "future", "image_path", "frame_data", "regions")
+
+    def __init__(self, loop, future, image_path, frame_data, regions):
+        self.loop = loop
+        self.future = future
+        self.image_path = image_path
+        self.frame_data = frame_data
+        self.regions = regions
+
+
+def _resolve(future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+# Пул потоков распознавания с ограниченной очередью заданий.
+# У каждого потока свой экземпляр ObjectIdentifier (и своя модель MediaPipe).
+# При переполнении очереди самое старое задание вытесняется и получает результат None.
+class IdentificationService:
+    def __init__(self, workers=2, queue_size=4, identifier_factory=ObjectIdentifier):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.identifier_factory = identifier_factory
+        self.jobs = deque()
+        self.condition = threading.Condition()
+        self.threads = []
+        self.is_running = False
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed_workers = 0
+        # Ни один поток не смог создать распознаватель: задания сразу получают результат-ошибку
+        self.unavailable = False
+        # Скользящее среднее времени распознавания одного кадра (сек) - по нему планируется бюджет ключевых кадров
+        self.average_seconds = 0.1
+        # Модель грузится в потоках распознавания; задания, пришедшие раньше, ждут в очереди.
+        # ready выставляется, когда первый поток готов, ready_listeners вызываются в этом потоке.
+        self.ready = threading.Event()
+        self.ready_listeners = []
+        self.ready_lock = threading.Lock()
+        _IDENTIFY_QUEUE.set_function(lambda: len(self.jobs))
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"identifier-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Сервис распознавания запущен: потоков {self.workers}, очередь {self.queue_size}.")
+
+    @property
+    def queue_depth(self):
+        with self.condition:
+            return len(self.jobs)
+
+    def submit(self, image_path=None, frame_data=None, regions=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        job = _IdentificationJob(loop, future, image_path, frame_data, regions)
+        dropped_job = None
+        with self.condition:
+            if self.unavailable:
+                future.set_result(["ошибка идентификации"])
+                return future
+            if len(self.jobs) >= self.queue_size:
+                dropped_job = self.jobs.popleft()
+                self.dropped += 1
+            self.jobs.append(job)
+            self.submitted += 1
+            self.condition.notify()
+        if dropped_job is not None:
+            logger.warning("Очередь распознавания переполнена, старое задание отброшено.")
+            _IDENTIFY_DROPPED.inc()
+            _resolve(dropped_job.future, None)
+        return future
+
+    async def identify(self, image_path=None, frame_data=None, regions=None):
+        return await self.submit(image_path=image_path, frame_data=frame_data, regions=regions)
+
+    def _set_ready(self):
+        with self.ready_lock:
+            if self.ready.is_set():
+                return
+            self.ready.set()
+        for listener in self.ready_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.error(f"Ошибка обработчика готовности распознавания: {e}", exc_info=True)
+
+    # Распознаватель потока; если фабрика упала, пробуем распознаватель по умолчанию
+    def _create_identifier(self):
+        try:
+            return self.identifier_factory()
+        except Exception as e:
+            logger.error(f"Не удалось создать распознаватель: {e}", exc_info=True)
+        if self.identifier_factory is ObjectIdentifier:
+            return None
+        try:
+            identifier = ObjectIdentifier()
+        except Exception as e:
+            logger.error(f"Не удалось создать распознаватель по умолчанию: {e}", exc_info=True)
+            return None
+        logger.warning("Поток распознавания работает с распознавателем по умолчанию.")
+        return identifier
+
+    # Без единого рабочего потока задания в очереди никто не разберет - отвечаем на них сразу
+    def _worker_failed(self):
+        with self.condition:
+            self.failed_workers += 1
+            if self.failed_workers < self.workers:
+                return
+            self.unavailable = True
+            pending = list(self.jobs)
+            self.jobs.clear()
+        logger.error("Ни один поток распознавания не запустился, оповещения уходят без распознавания.")
+        for job in pending:
+            try:
+                job.loop.call_soon_threadsafe(_resolve, job.future, ["ошибка идентификации"])
+            except RuntimeError:
+                pass
+
+    def _worker(self):
+        identifier = self._create_identifier()
+        if identifier is None:
+            self._worker_failed()
+            return
+        self._set_ready()
+        try:
+            while True:
+                with self.condition:
+                    while self.is_running and not self.jobs:
+                        self.condition.wait()
+                    if not self.is_running:
+                        return
+                    job = self.jobs.popleft()
+
+                if job.future.cancelled():
+                    continue
+                started = time.perf_counter()
+                try:
+                    result = identifier.identify_objects(image_path=job.image_path, frame_data=job.frame_data,
+                                                         regions=job.regions)
+                except Exception as e:
+                    logger.error(f"Ошибка распознавания: {e}", exc_info=True)
+                    result = ["ошибка идентификации"]
+                elapsed = time.perf_counter() - started
+                self.completed += 1
+                self.average_seconds += (elapsed - self.average_seconds) * 0.2
+                _IDENTIFY_SECONDS.observe(elapsed)
+                try:
+                    job.loop.call_soon_threadsafe(_resolve, job.future, result)
+                except RuntimeError:
+                    pass  # цикл событий уже закрыт
+        finally:
+            identifier.close()
+
+    def stop(self):
+        with self.condition:
+            self.is_running = False
+            pending = list(self.jobs)
+            self.jobs.clear()
+            self.condition.notify_all()
+        for job in pending:
+            try:
+                job.loop.call_soon_threadsafe(_resolve, job.future, None)
+            except RuntimeError:
+                pass
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
@@ -1,182 +1,458 @@
 # main.py
-import asyncio
 import time
+
+_PROCESS_STARTED = time.perf_counter()  # отсчет для отчета о времени запуска
+
+import asyncio
 import os
 import logging
-from collections import Counter
 
 try:
     from config import (
-        MIN_CONTOUR_AREA, FRAME_WIDTH, FRAME_HEIGHT,
+        MIN_CONTOUR_AREA, FRAME_WIDTH, FRAME_HEIGHT, CAPTURE_BUFFER_SIZE, CAMERA_SOURCES,
+        DETECTION_ZONES, ZONES_FILE,
+        MOTION_DETECTION_MODE, MOTION_DOWNSCALE, MOTION_BACKGROUND, MOTION_LEARNING_RATE, VIDEO_QUEUE_SIZE,
         TELEGRAM_BOT_TOKEN, ALLOWED_USER_IDS,
-        PHOTO_COOLDOWN_PERIOD, VIDEO_FPS,
+        PHOTO_COOLDOWN_PERIOD, ALERT_WINDOW, ALERT_ALBUM_SIZE, VIDEO_FPS, VIDEO_SEGMENT_SECONDS, KEEP_SCREENSHOTS,
+        TRANSCODE_WORKERS, TRANSCODE_WIDTH, TRANSCODE_BITRATE_KBPS, TRANSCODE_TARGET_MB, THUMBNAIL_WIDTH,
         VIDEO_NO_MOTION_STOP_DELAY, SCREENSHOT_DIR, VIDEO_RECORD_PATH,
-        MAX_STORAGE_MB
+        PREROLL_SECONDS, PREROLL_MAX_MB, EVENTS_DB, EVENTS_RETENTION_DAYS,
+        PHOTO_STORAGE_MB, VIDEO_STORAGE_MB, IDENTIFY_WORKERS, IDENTIFY_QUEUE_SIZE,
+        IDENTIFY_REGION_PADDING, IDENTIFY_CACHE_SIZE, IDENTIFY_CACHE_TTL,
+        VIDEO_IDENTIFY_BUDGET, VIDEO_IDENTIFY_INTERVAL, VIDEO_IDENTIFY_AREA_CHANGE,
+        SCHEDULER_IDLE_FPS, SCHEDULER_ACTIVE_FPS, SCHEDULER_HOLD_SECONDS, SCHEDULER_STATS_INTERVAL,
+        METRICS_ENABLED, METRICS_HOST, METRICS_PORT
     )
     from bot_handler import bot_state
 except ModuleNotFoundError as e:
     print(f"Критическая ошибка импорта в main.py: {e}. Убедитесь, что все файлы на месте и PYTHONPATH настроен.")
     exit(1)
 
-from motion_detection import MotionDetector
-from image_processing import ObjectIdentifier
-from bot_handler import start_bot_polling as start_telegram_bot, broadcast_alert
+from motion_detection import MotionDetector, ProcessMotionDetector, AdaptiveScheduler, load_zones
+from motion_detection.transcode import VideoTranscoder
+from image_processing import (
+    ObjectIdentifier, IdentificationService, RegionLabelCache, KeyframeSampler, format_detected_objects,
+    merge_detected_objects
+)
+from bot_handler import AlertAggregator, load_bot
+from bot_handler.aggregator import motion_score
+from storage import StorageManager, EventIndex
+from monitoring import REGISTRY
+from monitoring.startup import StartupTimer
 
 logger = logging.getLogger(__name__)
 
+# Отчет о запуске пишется в лог, когда готовы анализ первого кадра, модель распознавания и бот
+startup = StartupTimer(_PROCESS_STARTED, expected=("первый кадр", "модель распознавания", "Telegram"))
+_bot_loading = None
 
-def format_detected_objects(detected_list):
-    if not detected_list or detected_list == ["неизвестный объект"] or detected_list == ["ошибка идентификации"]:
-        return "Объекты не идентифицированы."
+_STEP_SECONDS = REGISTRY.histogram("pipeline_step_seconds", "Время одного прохода анализа по всем камерам")
+_ALERT_SECONDS = REGISTRY.histogram("alert_delivery_seconds", "От кадра с движением до рассылки оповещения")
+_STORAGE_BYTES = REGISTRY.gauge("storage_used_bytes", "Занято хранилищем")
+_STORAGE_FILES = REGISTRY.gauge("storage_files", "Файлов в хранилище")
+_VIDEO_QUEUE = REGISTRY.gauge("video_queue_depth", "Кадров в очереди записи видео")
+_EVENTS_QUEUE = REGISTRY.gauge("events_queue_depth", "Событий в очереди записи журнала")
 
-    counts = Counter(detected_list)
-    parts = []
-    for item, count in counts.items():
-        parts.append(f"{item}: {count}")
-    return "В кадре: " + ", ".join(parts) + "."
 
+# Модуль бота (aiogram) импортируется несколько секунд - в фоновом потоке и один раз.
+# Захват и детекция к этому времени уже работают, оповещения до готовности бота ждут его.
+async def bot_module():
+    global _bot_loading
+    if _bot_loading is None:
+        _bot_loading = asyncio.ensure_future(asyncio.to_thread(load_bot))
+    module = await _bot_loading
+    startup.mark("Telegram")
+    return module
 
-def get_directory_size_mb(directory):
-    total = 0
-    if os.path.exists(directory):
-        for f in os.listdir(directory):
-            fp = os.path.join(directory, f)
-            if os.path.isfile(fp):
-                total += os.path.getsize(fp)
-    return total / (1024 * 1024)
 
+async def broadcast_alert(*args, **kwargs):
+    await (await bot_module()).broadcast_alert(*args, **kwargs)
 
-def cleanup_old_files(directory, max_mb):
-    if not os.path.exists(directory):
-        return
 
-    current_size = get_directory_size_mb(directory)
-    if current_size <= max_mb:
-        return
+async def broadcast_album(*args, **kwargs):
+    await (await bot_module()).broadcast_album(*args, **kwargs)
 
-    files = []
-    for f in os.listdir(directory):
-        fp = os.path.join(directory, f)
-        if os.path.isfile(fp):
-            files.append((fp, os.path.getmtime(fp), os.path.getsize(fp)))
 
-    files.sort(key=lambda x: x[1])
+async def start_telegram_bot():
+    await (await bot_module()).start_bot_polling()
 
-    for fp, _, size in files:
-        if current_size <= max_mb * 0.8:
-            break
-        try:
-            os.remove(fp)
-            current_size -= size / (1024 * 1024)
-            logger.info(f"Удален старый файл: {fp}")
-        except Exception as e:
-            logger.warning(f"Не удалось удалить {fp}: {e}")
+
+async def send_identified_alert(caption_prefix, objects_future, file_path=None, file_type="photo",
+                                file_data=None, filename=None, video_info=None):
+    detected_objects_list = await objects_future if objects_future is not None else None
+    await broadcast_alert(f"{caption_prefix}{format_detected_objects(detected_objects_list)}", file_path, file_type,
+                          file_data=file_data, filename=filename, video_info=video_info)
+
+
+# Объекты нескольких ключевых кадров одной подписью. Возвращает задачу: ее ждут и журнал, и отправка.
+def merged_objects(objects_futures):
+    async def merge():
+        return merge_detected_objects(await asyncio.gather(*objects_futures))
+    return asyncio.ensure_future(merge())
+
+
+# Видео уходит сжатой копией с миниатюрой, оригинал остается на диске. Копия удаляется после отправки.
+# motion_time - time.time() последнего кадра с движением в ролике, от него считается задержка оповещения
+async def send_video_alert(caption_prefix, objects_future, video_path, transcoder=None, events=None, camera="1",
+                           motion_area=0, motion_time=None):
+    started = motion_time if motion_time is not None else time.time()
+    # Перекодирование идет в пуле процессов одновременно с распознаванием ключевых кадров
+    transcoding = asyncio.ensure_future(transcoder.transcode(video_path)) if transcoder else None
+    if events is not None:
+        detected_objects_list = await objects_future if objects_future is not None else None
+        events.record(camera, "video", media=[video_path], objects=detected_objects_list, motion_area=motion_area)
+    rendition = await transcoding if transcoding is not None else None
+    if rendition is None:
+        await send_identified_alert(caption_prefix, objects_future, video_path, "video")
+        _ALERT_SECONDS.labels(kind="video").observe(time.time() - started)
+        return
+    # Копия не меньше оригинала (кадр уже узкий) - отправляем оригинал с его размерами, миниатюра остается
+    upload_path, video_info = rendition["video"], rendition
+    if rendition["bytes"] >= rendition["source_bytes"]:
+        upload_path = video_path
+        video_info = dict(rendition, width=rendition["source_width"], height=rendition["source_height"])
+    try:
+        await send_identified_alert(caption_prefix, objects_future, upload_path, "video", video_info=video_info)
+        _ALERT_SECONDS.labels(kind="video").observe(time.time() - started)
+    finally:
+        await asyncio.to_thread(transcoder.cleanup, rendition)
+
+
+# Альбом лучших кадров всплеска: JPEG кодируются в фоне, подпись собирается по всем кадрам
+async def send_album_alert(caption_prefix, detector, candidates, objects_futures, events=None, camera="1"):
+    encoded = await asyncio.to_thread(
+        lambda: [detector.encode_screenshot(c.frame, captured_at=c.timestamp) for c in candidates])
+    photos = [(name, jpeg) for name, jpeg in encoded if jpeg is not None]
+    if not photos:
+        logger.warning("Не удалось закодировать скриншоты.")
+        return
+    # Скриншоты пишутся на диск параллельно с отправкой: рассылка не ждет карту памяти
+    saving = None
+    if KEEP_SCREENSHOTS:
+        saving = asyncio.ensure_future(asyncio.to_thread(
+            lambda: [detector.save_screenshot(name, jpeg, SCREENSHOT_DIR) for name, jpeg in photos]))
+    detected_objects_list = merge_detected_objects(await asyncio.gather(*objects_futures))
+
+    # Событие журнала записывается, когда известны пути сохраненных файлов
+    async def record_event():
+        saved = await saving if saving is not None else []
+        if events is not None:
+            events.record(camera, "photo", media=saved, objects=detected_objects_list,
+                          motion_area=max(c.score for c in candidates), timestamp=candidates[0].timestamp)
+
+    recording = asyncio.ensure_future(record_event())
+    await broadcast_album(f"{caption_prefix}{format_detected_objects(detected_objects_list)}", photos)
+    _ALERT_SECONDS.labels(kind="photo").observe(time.time() - candidates[0].timestamp)
+    await recording
+
+
+def create_detector(name=None, use_process=False, zones=None):
+    detector_class = ProcessMotionDetector if use_process else MotionDetector
+    return detector_class(min_area=MIN_CONTOUR_AREA, frame_width=FRAME_WIDTH, frame_height=FRAME_HEIGHT,
+                          capture_buffer_size=CAPTURE_BUFFER_SIZE,
+                          mode=MOTION_DETECTION_MODE, downscale=MOTION_DOWNSCALE,
+                          background=MOTION_BACKGROUND, learning_rate=MOTION_LEARNING_RATE,
+                          preroll_seconds=PREROLL_SECONDS,
+                          preroll_max_bytes=int(PREROLL_MAX_MB * 1024 * 1024), preroll_fps=VIDEO_FPS,
+                          video_queue_size=VIDEO_QUEUE_SIZE, name=name, zones=zones)
+
+
+# Состояние фото/видео режима одной камеры. Камер может быть несколько,
+# бот и рассылка оповещений при этом общие.
+class CameraPipeline:
+    def __init__(self, detector, identifier, spawn_alert, title=None, camera_key="1", transcoder=None, events=None):
+        self.detector = detector
+        self.transcoder = transcoder
+        self.events = events  # журнал событий, None - не вести
+        self.camera_key = camera_key  # номер камеры в зонах детекции
+        self.zones_version = bot_state.zones_version
+        self.identifier = identifier
+        self.spawn_alert = spawn_alert
+        self.caption_prefix = f"[{title}] " if title else ""
+        self.last_photo_alert_time = 0
+        self.aggregator = AlertAggregator(window=ALERT_WINDOW, max_items=ALERT_ALBUM_SIZE)
+        self.is_video_recording = False
+        self.current_video_filename = None
+        self.last_motion_time_video = 0
+        # Ключевые кадры записи распознаются в пределах бюджета; подпись части - по кадрам этой части,
+        # итоговая подпись - по всей записи
+        self.sampler = KeyframeSampler(budget=VIDEO_IDENTIFY_BUDGET, interval=VIDEO_IDENTIFY_INTERVAL,
+                                       area_change=VIDEO_IDENTIFY_AREA_CHANGE)
+        self.video_keyframes = []
+        self.segment_keyframes = []
+        self.video_motion_area = 0
+        self.loop = asyncio.get_running_loop()
+
+    async def interrupt_recording(self, reason):
+        if not self.is_video_recording:
+            return
+        # Поток записи дописывает очередь кадров, не блокируем цикл событий
+        await asyncio.to_thread(self.detector.stop_video_recording)
+        logger.info(f"Запись видео {self.current_video_filename} {reason}.")
+        self.is_video_recording = False
+        self.current_video_filename = None
+        self.video_keyframes = []
+        self.segment_keyframes = []
+
+    # Закрывает окно всплеска и отправляет собранные кадры
+    def flush_photos(self):
+        candidates = self.aggregator.take()
+        if not candidates:
+            return
+        # Распознавание идет в пуле потоков по исходным кадрам, на диск скриншоты пишутся только если их хранить
+        objects_futures = [self.identifier.submit(frame_data=c.frame, regions=c.regions) for c in candidates]
+        self.spawn_alert(send_album_alert(f"🚨 {self.caption_prefix}Фото: ", self.detector, candidates,
+                                          objects_futures, events=self.events, camera=self.camera_key))
+
+    def _on_segment(self, path, index):
+        # Вызывается в потоке записи: готовая часть уходит в Telegram, пока запись продолжается
+        self.loop.call_soon_threadsafe(self._send_segment, path, index)
+
+    def _send_segment(self, path, index):
+        keyframes = self.segment_keyframes
+        # Следующая часть начинается с последнего известного состава кадра
+        self.segment_keyframes = keyframes[-1:]
+        self.spawn_alert(send_video_alert(f"📹 {self.caption_prefix}Видеозапись, часть {index + 1}: ",
+                                          merged_objects(keyframes), path, self.transcoder, events=self.events,
+                                          camera=self.camera_key, motion_area=self.video_motion_area,
+                                          motion_time=self.last_motion_time_video))
+
+    def _sample_keyframe(self, current_time, frame, regions):
+        area = motion_score(regions)
+        self.video_motion_area = max(self.video_motion_area, area)
+        # Оповещения фото режима и других камер важнее: при занятой очереди ключевой кадр пропускается
+        if self.identifier.queue_depth or not self.sampler.offer(current_time, area, self.identifier.average_seconds):
+            return
+        future = self.identifier.submit(frame_data=frame, regions=regions)
+        self.video_keyframes.append(future)
+        self.segment_keyframes.append(future)
+
+    async def pause(self):
+        self.detector.set_analysis_enabled(False)
+        # Без мониторинга пре-запись не нужна: поток захвата перестает кодировать кадры в JPEG,
+        # а старые кадры не попадут в начало ролика после возобновления. Включает ее снова step()
+        self.detector.preroll_active = False
+        if self.detector.preroll:
+            self.detector.preroll.clear()
+        self.flush_photos()
+        # Если выключили мониторинг во время записи
+        # Можно отправить незаконченное видео или удалить
+        # os.remove(current_video_filename) # если не хотим отправлять
+        await self.interrupt_recording("прервана из-за отключения мониторинга")
+
+    # Возвращает True, если в кадре есть движение или идет запись
+    async def step(self):
+        detector = self.detector
+        if self.zones_version != bot_state.zones_version:
+            # Зоны изменили через бота
+            detector.set_zones(bot_state.zones.get(self.camera_key))
+            self.zones_version = bot_state.zones_version
+        detector.set_analysis_enabled(True)
+        # Пре-запись нужна только в видео режиме
+        detector.preroll_active = bot_state.current_mode == "video"
+        frame_with_motion, motion_regions = detector.detect_motion()
+        current_time = time.time()
+        if detector.last_dropped_frames:
+            logger.debug(f"Пропущено кадров захвата: {detector.last_dropped_frames}")
+
+        if bot_state.current_mode == "photo":
+            # Переключились с видео на фото во время записи
+            # Решаем, отправлять ли его
+            # self.spawn_alert(send_identified_alert("Видеозапись остановлена: ", merged_objects(self.video_keyframes), self.current_video_filename, "video"))
+            await self.interrupt_recording("остановлена из-за смены режима на фото")
+
+            # Кадры всплеска копятся в окне ALERT_WINDOW и уходят одним альбомом,
+            # пауза PHOTO_COOLDOWN_PERIOD отсчитывается от отправки альбома
+            if frame_with_motion is not None and (
+                    self.aggregator.active or (current_time - self.last_photo_alert_time) > PHOTO_COOLDOWN_PERIOD):
+                if not self.aggregator.active:
+                    logger.info(f"{self.caption_prefix}Фото режим: Движение обнаружено!")
+                self.aggregator.add(current_time, frame_with_motion, motion_regions)
+            if self.aggregator.ready(current_time):
+                self.flush_photos()
+                self.last_photo_alert_time = current_time
+
+        elif bot_state.current_mode == "video":
+            # Переключились с фото на видео во время всплеска - собранные кадры не теряем
+            self.flush_photos()
+            if frame_with_motion is not None:
+                self.last_motion_time_video = current_time
+                if not self.is_video_recording:
+                    self.current_video_filename = detector.start_video_recording(
+                        directory=VIDEO_RECORD_PATH, fps=VIDEO_FPS,
+                        segment_seconds=VIDEO_SEGMENT_SECONDS, on_segment=self._on_segment)
+                    if self.current_video_filename:
+                        self.is_video_recording = True
+                        # Объекты для заголовка распознаются в фоне, запись при этом продолжается
+                        objects_future = self.identifier.submit(frame_data=frame_with_motion, regions=motion_regions)
+                        self.video_keyframes = [objects_future]
+                        self.segment_keyframes = [objects_future]
+                        self.video_motion_area = motion_score(motion_regions)
+                        self.sampler.reset(current_time, self.video_motion_area)
+                        self.spawn_alert(send_identified_alert(f"📹 {self.caption_prefix}Началась видеозапись: ",
+                                                               objects_future))  # Уведомление без файла
+                        logger.info(f"Видео режим: Начата запись видео {self.current_video_filename}")
+                    else:
+                        logger.error("Не удалось начать запись видео.")
+                else:
+                    self._sample_keyframe(current_time, frame_with_motion, motion_regions)
+
+            elif self.is_video_recording:  # Движения нет, но запись идет
+                if (current_time - self.last_motion_time_video) > VIDEO_NO_MOTION_STOP_DELAY:
+                    logger.info(
+                        f"Видео режим: Нет движения в течение {VIDEO_NO_MOTION_STOP_DELAY} сек. Остановка записи.")
+                    # Поток записи дописывает очередь кадров, не блокируем цикл событий
+                    video_path = await asyncio.to_thread(detector.stop_video_recording)
+                    stats = detector.recording_stats()
+                    logger.info(f"Статистика записи: {stats}, пре-запись: {detector.preroll_stats()}, "
+                                f"распознавание: {self.sampler.stats()}")
+                    if video_path:
+                        segments = stats.get("segments", 1) if stats else 1
+                        part = f" (часть {segments})" if segments > 1 else ""
+                        self.spawn_alert(send_video_alert(
+                            f"📹 {self.caption_prefix}Видеозапись завершена{part}: ",
+                            merged_objects(self.video_keyframes), video_path, self.transcoder, events=self.events,
+                            camera=self.camera_key, motion_area=self.video_motion_area,
+                            motion_time=self.last_motion_time_video))
+                    self.is_video_recording = False
+                    self.current_video_filename = None
+                    self.video_keyframes = []
+                    self.segment_keyframes = []
+
+        return frame_with_motion is not None or self.is_video_recording
+
+    def shutdown(self):
+        # Убедимся, что видео сохранилось при экстренном выходе
+        if self.is_video_recording and self.detector.recorder:
+            path = self.detector.stop_video_recording()
+            logger.info(f"Принудительно сохранено видео: {path}")
+        logger.info(f"{self.caption_prefix}Фото-альбомы: {self.aggregator.stats()}")
+        self.detector.stop_capture()
 
 
 async def main_loop():
     logger.info("Инициализация системы детекции...")
+    REGISTRY.enabled = METRICS_ENABLED
     if not os.path.exists(SCREENSHOT_DIR):
         os.makedirs(SCREENSHOT_DIR, exist_ok=True)
     if not os.path.exists(VIDEO_RECORD_PATH):
         os.makedirs(VIDEO_RECORD_PATH, exist_ok=True)
 
-    cleanup_old_files(SCREENSHOT_DIR, MAX_STORAGE_MB / 2)
-    cleanup_old_files(VIDEO_RECORD_PATH, MAX_STORAGE_MB / 2)
-
-    detector = MotionDetector(min_area=MIN_CONTOUR_AREA, frame_width=FRAME_WIDTH, frame_height=FRAME_HEIGHT)
-    identifier = ObjectIdentifier()
-
-    if not detector.start_capture(camera_index=0):
+    # Индекс файлов строится одним проходом os.scandir, дальше обновляется по мере записи
+    storage = StorageManager()
+    storage.add_category("photo", SCREENSHOT_DIR, PHOTO_STORAGE_MB)
+    storage.add_category("video", VIDEO_RECORD_PATH, VIDEO_STORAGE_MB)
+    for category in ("photo", "video"):
+        _STORAGE_BYTES.set_function(lambda category=category: storage.usage()[category]["bytes"], category=category)
+        _STORAGE_FILES.set_function(lambda category=category: storage.usage()[category]["files"], category=category)
+    # Журнал событий пишется в фоновом потоке; строки удаляются вместе с файлами при очистке
+    events = EventIndex(EVENTS_DB, retention_days=EVENTS_RETENTION_DAYS)
+
+    # Потоки распознавания делят кеш меток: повторяющиеся области кадра не прогоняются через модель.
+    # Модель загружается в самих потоках, детекция ее не ждет.
+    label_cache = RegionLabelCache(max_entries=IDENTIFY_CACHE_SIZE, ttl=IDENTIFY_CACHE_TTL)
+    identifier = IdentificationService(
+        workers=IDENTIFY_WORKERS, queue_size=IDENTIFY_QUEUE_SIZE,
+        identifier_factory=lambda: ObjectIdentifier(cache=label_cache, region_padding=IDENTIFY_REGION_PADDING))
+    identifier.ready_listeners.append(lambda: startup.mark("модель распознавания"))
+    identifier.start()
+    # Перекодирование видео для отправки в пуле процессов, 0 потоков - отправка оригинала
+    transcoder = None
+    if TRANSCODE_WORKERS > 0:
+        transcoder = VideoTranscoder(os.path.join(VIDEO_RECORD_PATH, "upload"), workers=TRANSCODE_WORKERS,
+                                     width=TRANSCODE_WIDTH, bitrate_kbps=TRANSCODE_BITRATE_KBPS,
+                                     target_mb=TRANSCODE_TARGET_MB, thumbnail_width=THUMBNAIL_WIDTH)
+    # Ссылки на фоновые задачи рассылки, чтобы их не собрал сборщик мусора
+    alert_tasks = set()
+
+    def spawn_alert(coro):
+        task = asyncio.create_task(coro)
+        alert_tasks.add(task)
+        task.add_done_callback(alert_tasks.discard)
+
+    # Одна камера работает в этом процессе, несколько - каждая в своем процессе
+    multi_camera = len(CAMERA_SOURCES) > 1
+    bot_state.zones = load_zones(ZONES_FILE, DETECTION_ZONES)
+    detectors = [create_detector(name=f"cam{index}" if multi_camera else None, use_process=multi_camera,
+                                 zones=bot_state.zones.get(str(index)))
+                 for index in range(1, len(CAMERA_SOURCES) + 1)]
+    for detector in detectors:
+        detector.file_listeners.append(storage.add_file)
+    # Процессы камер запускаются и открывают источники не мгновенно, поэтому параллельно,
+    # и одновременно с обходом хранилища и открытием журнала событий
+    started, storage_error, events_error = await asyncio.gather(
+        asyncio.gather(*(asyncio.to_thread(detector.start_capture, source)
+                         for detector, source in zip(detectors, CAMERA_SOURCES))),
+        asyncio.to_thread(storage.bootstrap), asyncio.to_thread(events.start), return_exceptions=True)
+    startup.mark("захват")
+    for error in (started, storage_error):
+        if isinstance(error, BaseException):
+            raise error
+    storage_task = asyncio.create_task(storage.run())
+    if isinstance(events_error, BaseException):
+        logger.error(f"Не удалось открыть журнал событий {EVENTS_DB}: {events_error}")
+        events = None
+    else:
+        storage.removal_listeners.append(events.forget_media)
+        bot_state.events = events
+        _EVENTS_QUEUE.set_function(events.queue.qsize)
+    # Частота анализа подстраивается под сцену, цикл просыпается по кадрам камер
+    scheduler = AdaptiveScheduler(idle_fps=SCHEDULER_IDLE_FPS, active_fps=SCHEDULER_ACTIVE_FPS,
+                                  hold_seconds=SCHEDULER_HOLD_SECONDS)
+    pipelines = []
+    for index, (detector, source, ok) in enumerate(zip(detectors, CAMERA_SOURCES, started), start=1):
+        if not ok:
+            logger.error(f"Не удалось запустить детектор движения для источника {source}.")
+            continue
+        scheduler.attach(detector)
+        _VIDEO_QUEUE.set_function(lambda detector=detector: detector.recorder.queue_depth if detector.recorder else 0,
+                                  camera=detector.name or "cam1")
+        pipelines.append(CameraPipeline(detector, identifier, spawn_alert,
+                                        title=f"Камера {index}" if multi_camera else None,
+                                        camera_key=str(index), transcoder=transcoder, events=events))
+
+    if not pipelines:
         logger.error("Не удалось запустить детектор движения.")
+        identifier.stop()
+        storage_task.cancel()
+        if events:
+            events.stop()
         return
 
-    logger.info("Система детекции движения запущена.")
-
-    last_photo_alert_time = 0
-    is_video_recording = False
-    current_video_filename = None
-    last_motion_time_video = 0
-    initial_objects_for_video_caption = []
+    logger.info(f"Система детекции движения запущена, камер: {len(pipelines)}.")
+    metrics_runner = None
+    if METRICS_ENABLED and METRICS_PORT:
+        from monitoring.server import start_metrics_server  # aiohttp нужен только здесь
+        try:
+            metrics_runner = await start_metrics_server(REGISTRY, METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.error(f"Не удалось запустить сервер метрик на {METRICS_HOST}:{METRICS_PORT}: {e}")
 
+    last_stats_time = time.monotonic()
     try:
         while True:
             if not bot_state.monitoring_active:
-                await asyncio.sleep(1)
-                if is_video_recording:  # Если выключили мониторинг во время записи
-                    detector.stop_video_recording()
-                    logger.info(f"Запись видео {current_video_filename} прервана из-за отключения мониторинга.")
-                    # Можно отправить незаконченное видео или удалить
-                    # os.remove(current_video_filename) # если не хотим отправлять
-                    is_video_recording = False
-                    current_video_filename = None
+                for pipeline in pipelines:
+                    await pipeline.pause()
+                # Ждем команды бота вместо периодической проверки флага
+                bot_state.state_changed.clear()
+                await bot_state.state_changed.wait()
                 continue
 
-            frame_with_motion = detector.detect_motion()
-            current_time = time.time()
-
-            if bot_state.current_mode == "photo":
-                if is_video_recording:  # Переключились с видео на фото во время записи
-                    detector.stop_video_recording()
-                    logger.info(f"Запись видео {current_video_filename} остановлена из-за смены режима на фото.")
-                    # Решаем, отправлять ли его
-                    # await broadcast_alert(f"Видеозапись остановлена: {format_detected_objects(initial_objects_for_video_caption)}", current_video_filename, "video")
-                    is_video_recording = False
-                    current_video_filename = None
-
-                if frame_with_motion is not None:
-                    if (current_time - last_photo_alert_time) > PHOTO_COOLDOWN_PERIOD:
-                        logger.info("Фото режим: Движение обнаружено!")
-                        screenshot_path = detector.capture_screenshot(frame_with_motion, directory=SCREENSHOT_DIR)
-                        if screenshot_path:
-                            detected_objects_list = identifier.identify_objects(screenshot_path)
-                            caption = f"🚨 Фото: {format_detected_objects(detected_objects_list)}"
-                            await broadcast_alert(caption, screenshot_path, "photo")
-                            last_photo_alert_time = current_time
-                        else:
-                            logger.warning("Не удалось сохранить скриншот.")
-                else:  # Нет движения в фото режиме
-                    pass  # Ничего не делаем
-
-
-            elif bot_state.current_mode == "video":
-                if frame_with_motion is not None:
-                    last_motion_time_video = current_time
-                    if not is_video_recording:
-                        current_video_filename = detector.start_video_recording(directory=VIDEO_RECORD_PATH,
-                                                                                fps=VIDEO_FPS)
-                        if current_video_filename:
-                            is_video_recording = True
-                            # Получаем объекты для заголовка в начале записи
-                            temp_shot_for_caption = detector.capture_screenshot(frame_with_motion,
-                                                                                SCREENSHOT_DIR)  # Временный кадр для анализа
-                            if temp_shot_for_caption:
-                                initial_objects_for_video_caption = identifier.identify_objects(temp_shot_for_caption)
-                                os.remove(temp_shot_for_caption)  # Удаляем временный кадр
-                            else:
-                                initial_objects_for_video_caption = ["не удалось получить объекты"]
-
-                            caption_start = f"📹 Началась видеозапись: {format_detected_objects(initial_objects_for_video_caption)}"
-                            await broadcast_alert(caption_start)  # Уведомление без файла
-                            logger.info(f"Видео режим: Начата запись видео {current_video_filename}")
-                        else:
-                            logger.error("Не удалось начать запись видео.")
-
-                    if is_video_recording:
-                        detector.write_video_frame(frame_with_motion)
-
-                elif is_video_recording:  # Движения нет, но запись идет
-                    if (current_time - last_motion_time_video) > VIDEO_NO_MOTION_STOP_DELAY:
-                        logger.info(
-                            f"Видео режим: Нет движения в течение {VIDEO_NO_MOTION_STOP_DELAY} сек. Остановка записи.")
-                        video_path = detector.stop_video_recording()
-                        if video_path:
-                            caption_end = f"📹 Видеозапись завершена: {format_detected_objects(initial_objects_for_video_caption)}"
-                            await broadcast_alert(caption_end, video_path, "video")
-                        is_video_recording = False
-                        current_video_filename = None
-                        initial_objects_for_video_caption = []
-
-            await asyncio.sleep(0.05)  # Уменьшаем задержку для более плавной записи видео
+            await scheduler.wait()
+            started_at = time.perf_counter()
+            motion = False
+            for pipeline in pipelines:
+                motion = await pipeline.step() or motion
+            busy = time.perf_counter() - started_at
+            scheduler.record(motion, busy)
+            _STEP_SECONDS.observe(busy)
+            if not startup.reported and any(p.detector.last_frame is not None for p in pipelines):
+                startup.mark("первый кадр")
+
+            if time.monotonic() - last_stats_time >= SCHEDULER_STATS_INTERVAL:
+                logger.info(f"Планировщик анализа: {scheduler.stats(reset=True)}")
+                last_stats_time = time.monotonic()
 
     except KeyboardInterrupt:
         logger.info("Остановка основного цикла по команде пользователя...")
@@ -184,17 +460,31 @@ async def main_loop():
         logger.error(f"Произошла ошибка в главном цикле: {e}", exc_info=True)
     finally:
         logger.info("Завершение работы детектора...")
-        if is_video_recording and detector.video_writer:  # Убедимся, что видео сохранилось при экстренном выходе
-            path = detector.stop_video_recording()
-            logger.info(f"Принудительно сохранено видео: {path}")
-        detector.stop_capture()
+        for pipeline in pipelines:
+            pipeline.shutdown()
+        identifier.stop()
+        logger.info(f"Кеш распознавания: {label_cache.stats()}")
+        if alert_tasks:
+            await asyncio.gather(*alert_tasks, return_exceptions=True)
+        if transcoder:
+            logger.info(f"Перекодирование видео: {transcoder.stats()}")
+            transcoder.stop()
+        storage_task.cancel()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if events:
+            bot_state.events = None
+            logger.info(f"Журнал событий: {events.stats()}")
+            await asyncio.to_thread(events.stop)
+        logger.info(f"Использование хранилища: {storage.usage()}")
         logger.info("Детектор остановлен.")
 
 
 async def main_app_entrypoint():
     logger.info("Запуск основного приложения...")
-    telegram_task = asyncio.create_task(start_telegram_bot())
+    # Детекция стартует первой, бот догружается в фоне
     main_loop_task = asyncio.create_task(main_loop())
+    telegram_task = asyncio.create_task(start_telegram_bot())
 
     try:
         done, pending = await asyncio.wait(
@@ -0,0 +1,2 @@
+# monitoring/__init__.py
+from .metrics import REGISTRY, MetricsRegistry, LATENCY_BUCKETS
@@ -0,0 +1,225 @@
+# monitoring/metrics.py
+import bisect
+import threading
+
+# Границы корзин гистограмм задержек (сек): от миллисекунд анализа кадра до десятков секунд загрузки видео
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry, name, help_text):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(sorted((name, str(value)) for name, value in labels.items()))
+        child = self.children.get(key)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("registry", "value", "lock")
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if self.registry.enabled:
+            with self.lock:  # счетчики пополняются из потоков захвата, распознавания и записи
+                self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild(self.registry)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            yield self.name + "_total", key, child.value
+
+
+class _GaugeChild:
+    __slots__ = ("registry", "value")
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.value = 0.0
+
+    def set(self, value):
+        if self.registry.enabled:
+            self.value = value
+
+
+# Значение задается напрямую или функцией, которая вызывается только при чтении метрик:
+# очереди и хранилище не платят ничего, пока метрики никто не читает
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text):
+        super().__init__(registry, name, help_text)
+        self.functions = {}
+
+    def _new_child(self):
+        return _GaugeChild(self.registry)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function, **labels):
+        key = tuple(sorted((name, str(value)) for name, value in labels.items()))
+        self.functions[key] = function
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            yield self.name, key, child.value
+        for key, function in list(self.functions.items()):
+            try:
+                value = function()
+            except Exception:
+                continue
+            if value is not None:
+                yield self.name, key, value
+
+
+class _HistogramChild:
+    __slots__ = ("registry", "buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, registry, buckets):
+        self.registry = registry
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    # Квантиль по корзинам с линейной интерполяцией внутри корзины, как histogram_quantile в Prometheus
+    def quantile(self, q):
+        with self.lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help_text)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.registry, self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        for key, child in list(self.children.items()):
+            with child.lock:
+                counts, total, value_sum = list(child.counts), child.count, child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield self.name + "_bucket", key + (("le", le),), cumulative
+            yield self.name + "_sum", key, value_sum
+            yield self.name + "_count", key, total
+
+
+# Реестр метрик процесса. При enabled=False запись в метрики - одна проверка флага.
+class MetricsRegistry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, metric_class, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(self, name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    # Краткая сводка для людей: счетчики и показатели как есть, у гистограмм - число, p50 и p95 в мс
+    def summary(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            if isinstance(metric, Histogram):
+                for key, child in sorted(metric.children.items()):
+                    if child.count:
+                        p50, p95 = child.quantile(0.5), child.quantile(0.95)
+                        lines.append(f"{metric.name}{_format_labels(key)}: n={child.count}, "
+                                     f"p50={p50 * 1000:.1f} мс, p95={p95 * 1000:.1f} мс")
+                continue
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)}: {value:g}")
+        return lines
+
+    # Текстовый формат Prometheus
+    def exposition(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
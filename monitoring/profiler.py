@@ -0,0 +1,155 @@
+# monitoring/profiler.py
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+# Пропускаем собственные кадры профилировщика
+_OWN_FILE = os.path.abspath(__file__)
+# Вершины стека, на которых поток ждет (блокировки, select, очереди), а не работает
+_IDLE_FRAMES = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"),
+                ("thread.py", "_worker"), ("threading.py", "_wait_for_tstate_lock")}
+
+
+def _describe(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _percent(part, total):
+    return f"{part * 100 / total:5.1f}%" if total else "  0.0%"
+
+
+# Выборочный профилировщик: раз в interval секунд снимает стеки всех потоков процесса через
+# sys._current_frames(). Программа не останавливается и не замедляется трассировкой каждого вызова,
+# как в cProfile, - стоимость пропорциональна частоте выборок. Одновременно tracemalloc
+# сравнивает снимки памяти в начале и в конце окна, чтобы найти места роста памяти.
+# Одновременно может работать только один профиль.
+class SamplingProfiler:
+    _lock = threading.Lock()
+
+    def __init__(self, interval=0.01, top=25, trace_memory=True, memory_frames=10):
+        self.interval = interval
+        self.top = top
+        self.trace_memory = trace_memory
+        self.memory_frames = memory_frames
+        self.samples = 0
+        self.self_counts = Counter()  # функция на вершине стека
+        self.total_counts = Counter()  # функция где-то в стеке
+        self.thread_counts = Counter()  # выборки, в которых поток работал, а не ждал
+        self.busy_samples = 0
+        self.thread_names = {}
+        self.idle_codes = {}
+
+    @classmethod
+    def busy(cls):
+        return cls._lock.locked()
+
+    def _is_idle(self, code):
+        idle = self.idle_codes.get(code)
+        if idle is None:
+            idle = self.idle_codes[code] = (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+        return idle
+
+    def _thread_name(self, ident):
+        if ident not in self.thread_names:
+            self.thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+        return self.thread_names.get(ident, str(ident))
+
+    def _sample(self, own_ident):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or self._is_idle(frame.f_code):
+                continue
+            self.thread_counts[self._thread_name(ident)] += 1
+            self.busy_samples += 1
+            seen = set()
+            top = True
+            while frame is not None:
+                code = frame.f_code
+                if top:
+                    self.self_counts[code] += 1
+                    top = False
+                if code not in seen:  # рекурсия считается один раз на стек
+                    seen.add(code)
+                    self.total_counts[code] += 1
+                frame = frame.f_back
+        self.samples += 1
+
+    # Блокирующий вызов на seconds секунд; запускать в отдельном потоке. Возвращает текст отчета.
+    def run(self, seconds):
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Профилирование уже запущено")
+        started_tracing = False
+        try:
+            before = None
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.memory_frames)
+                    started_tracing = True
+                before = tracemalloc.take_snapshot()
+
+            own_ident = threading.get_ident()
+            started = time.perf_counter()
+            deadline = started + seconds
+            overhead = 0.0
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                self._sample(own_ident)
+                overhead += time.perf_counter() - now
+                time.sleep(self.interval)
+            elapsed = time.perf_counter() - started
+
+            after = tracemalloc.take_snapshot() if self.trace_memory else None
+            return self._report(elapsed, overhead, before, after)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self._lock.release()
+
+    def _report(self, elapsed, overhead, before, after):
+        lines = [
+            f"Профиль процесса {os.getpid()} от {datetime.now():%Y-%m-%d %H:%M:%S}",
+            f"Окно {elapsed:.1f} сек, выборок {self.samples} (каждые {self.interval * 1000:g} мс), "
+            f"затраты на выборки {overhead * 1000:.0f} мс",
+            "Процессы камер при нескольких камерах профилируются отдельно и сюда не входят.",
+            "Ожидание (блокировки, select, очереди) не учитывается, проценты - от выборок работающих потоков.",
+            "",
+            "Загрузка потоков (доля окна, когда поток работал):",
+        ]
+        for name, count in self.thread_counts.most_common():
+            lines.append(f"  {_percent(count, self.samples)}  {name}")
+
+        lines += ["", f"Горячие функции - собственное время (топ {self.top}):"]
+        for code, count in self._visible(self.self_counts):
+            lines.append(f"  {_percent(count, self.busy_samples)}  {_describe(code)}")
+
+        lines += ["", f"Горячие функции - с вызываемыми (топ {self.top}):"]
+        for code, count in self._visible(self.total_counts):
+            lines.append(f"  {_percent(count, self.busy_samples)}  {_describe(code)}")
+
+        if before is not None and after is not None:
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, _OWN_FILE)]
+            before, after = before.filter_traces(filters), after.filter_traces(filters)
+            current, peak = tracemalloc.get_traced_memory()
+            lines += ["", f"Память под трассировкой: {current / 1024 / 1024:.1f} МБ, пик {peak / 1024 / 1024:.1f} МБ",
+                      f"Рост памяти за окно по местам выделения (топ {self.top}):"]
+            for stat in after.compare_to(before, "lineno")[:self.top]:
+                if stat.size_diff == 0:
+                    continue
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size_diff / 1024:+10.1f} КБ {stat.count_diff:+7d} блоков  "
+                             f"{frame.filename}:{frame.lineno}")
+            lines += ["", f"Крупнейшие места выделения в конце окна (топ {self.top}):"]
+            for stat in after.statistics("lineno")[:self.top]:
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size / 1024:10.1f} КБ {stat.count:7d} блоков  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines) + "\n"
+
+    def _visible(self, counts):
+        visible = [(code, count) for code, count in counts.most_common()
+                   if os.path.abspath(code.co_filename) != _OWN_FILE]
+        return visible[:self.top]
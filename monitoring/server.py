@@ -0,0 +1,22 @@
+# monitoring/server.py
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+# HTTP-сервер метрик для Prometheus: GET /metrics. По умолчанию слушает только localhost.
+async def start_metrics_server(registry, host="127.0.0.1", port=9102):
+    async def handle_metrics(request):
+        return web.Response(text=registry.exposition(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
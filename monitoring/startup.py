@@ -0,0 +1,40 @@
+# monitoring/startup.py
+import logging
+import threading
+import time
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_STARTUP_SECONDS = REGISTRY.gauge("startup_seconds", "Время от запуска процесса до готовности этапа")
+
+
+# Отметки времени запуска по этапам, от started (time.perf_counter() в начале main.py).
+# Отметки ставятся из любого потока; когда готовы все ожидаемые этапы, в лог пишется отчет.
+class StartupTimer:
+    def __init__(self, started=None, expected=()):
+        self.started = time.perf_counter() if started is None else started
+        self.expected = list(expected)
+        self.marks = {}
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def mark(self, stage):
+        with self.lock:
+            if stage in self.marks:
+                return
+            seconds = time.perf_counter() - self.started
+            self.marks[stage] = seconds
+            complete = not self.reported and all(name in self.marks for name in self.expected)
+            if complete:
+                self.reported = True
+        _STARTUP_SECONDS.labels(stage=stage).set(round(seconds, 3))
+        logger.debug(f"Запуск: {stage} через {seconds:.2f} сек")
+        if complete:
+            logger.info(f"Время запуска: {self.report()}")
+
+    def report(self):
+        with self.lock:
+            marks = sorted(self.marks.items(), key=lambda item: item[1])
+        return ", ".join(f"{stage} {seconds:.2f} сек" for stage, seconds in marks)
@@ -1,2 +1,9 @@
 # motion_detection/__init__.py
-from .detector import MotionDetector
\ No newline at end of file
+from .detector import MotionDetector
+from .shared import ProcessMotionDetector
+from .scheduler import AdaptiveScheduler
+from .zones import DetectionZones, load_zones, save_zones
+from .sources import (
+    FrameSource, VideoFileSource, ImageDirectorySource, SyntheticSource, ScriptedSource,
+    open_source
+)
\ No newline at end of file
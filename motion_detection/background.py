@@ -0,0 +1,127 @@
+# motion_detection/background.py
+import cv2
+import numpy as np
+
+BACKGROUND_ENGINES = ("frame", "average", "mog2")
+
+
+# Общая часть моделей фона. Все рабочие буферы выделяются на первом кадре (и при смене размера),
+# дальше OpenCV пишет результаты в них через dst=, поэтому в установившемся режиме кадр не выделяет память.
+# foreground() возвращает маску переднего плана после порога и dilate - это внутренний буфер модели,
+# он перезаписывается следующим кадром.
+class BackgroundModel:
+    def __init__(self, blur_size=21, scale=1):
+        self.blur_size = blur_size | 1
+        self.scale = max(1, scale)  # модель может работать на уменьшенном кадре
+        self.shape = None
+        self.small = None
+        self.gray = None
+        self.blurred = None
+        self.thresh = None
+        self.dilated = None
+        self.frames = 0
+
+    def _allocate(self, shape):
+        height, width = shape[:2]
+        small_size = (max(1, height // self.scale), max(1, width // self.scale))
+        self.shape = shape
+        self.small = np.empty(small_size + (3,), dtype=np.uint8) if self.scale > 1 else None
+        self.gray = np.empty(small_size, dtype=np.uint8)
+        self.blurred = np.empty(small_size, dtype=np.uint8)
+        self.thresh = np.empty(small_size, dtype=np.uint8)
+        self.dilated = np.empty(small_size, dtype=np.uint8)
+        self.frames = 0
+        self._allocate_model(small_size)
+
+    def _allocate_model(self, size):
+        pass
+
+    def _prepare(self, frame):
+        if frame.shape != self.shape:
+            self._allocate(frame.shape)
+        source = frame
+        if self.small is not None:
+            cv2.resize(frame, (self.small.shape[1], self.small.shape[0]), dst=self.small,
+                       interpolation=cv2.INTER_NEAREST)
+            source = self.small
+        cv2.cvtColor(source, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        cv2.GaussianBlur(self.gray, (self.blur_size, self.blur_size), 0, dst=self.blurred)
+        return self.blurred
+
+    def _update(self, blurred):
+        raise NotImplementedError
+
+    # mask - маска зон в масштабе кадра модели или None. Первый кадр только обучает модель.
+    def foreground(self, frame, mask=None):
+        blurred = self._prepare(frame)
+        first = self.frames == 0
+        self._update(blurred)
+        self.frames += 1
+        if first:
+            return None
+        if mask is not None:
+            cv2.bitwise_and(self.thresh, mask, dst=self.thresh)
+        cv2.dilate(self.thresh, None, dst=self.dilated, iterations=2)
+        return self.dilated
+
+    def reset(self):
+        self.shape = None
+
+
+# Скользящее среднее: фон = (1 - rate) * фон + rate * кадр.
+# Медленная смена освещения и шум усредняются и не считаются движением.
+class RunningAverageModel(BackgroundModel):
+    def __init__(self, learning_rate=0.05, threshold=25, **kwargs):
+        super().__init__(**kwargs)
+        self.learning_rate = learning_rate
+        self.threshold = threshold
+        self.accumulator = None
+        self.background = None
+        self.delta = None
+
+    def _allocate_model(self, size):
+        self.accumulator = np.empty(size, dtype=np.float32)
+        self.background = np.empty(size, dtype=np.uint8)
+        self.delta = np.empty(size, dtype=np.uint8)
+
+    def _update(self, blurred):
+        if self.frames == 0:
+            self.accumulator[...] = blurred
+            return
+        # Сравниваем с фоном до обновления, чтобы движение не растворялось в нем на этом же кадре.
+        # Общая яркость фона подгоняется под кадр: смена освещения быстрее скорости обучения не движение.
+        background_mean = cv2.mean(self.accumulator)[0]
+        gain = cv2.mean(blurred)[0] / background_mean if background_mean > 1 else 1.0
+        cv2.convertScaleAbs(self.accumulator, dst=self.background, alpha=gain)
+        cv2.absdiff(blurred, self.background, dst=self.delta)
+        cv2.threshold(self.delta, self.threshold, 255, cv2.THRESH_BINARY, dst=self.thresh)
+        cv2.accumulateWeighted(blurred, self.accumulator, self.learning_rate)
+
+
+# Смесь гауссиан (MOG2) из OpenCV: свое распределение на каждый пиксель, переносит
+# колышущиеся ветки и мерцание лучше скользящего среднего, но дороже.
+class MixtureModel(BackgroundModel):
+    def __init__(self, learning_rate=-1, history=500, var_threshold=16, **kwargs):
+        super().__init__(**kwargs)
+        self.learning_rate = learning_rate  # -1 - OpenCV выбирает сам по history
+        self.history = history
+        self.var_threshold = var_threshold
+        self.subtractor = None
+
+    def _allocate_model(self, size):
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=self.history,
+                                                             varThreshold=self.var_threshold, detectShadows=False)
+
+    def _update(self, blurred):
+        self.subtractor.apply(blurred, fgmask=self.thresh, learningRate=self.learning_rate)
+
+
+def create_background_model(engine, learning_rate=0.05, blur_size=21, scale=1):
+    if engine == "average":
+        return RunningAverageModel(learning_rate=learning_rate, blur_size=blur_size, scale=scale)
+    if engine == "mog2":
+        return MixtureModel(learning_rate=learning_rate if learning_rate > 0 else -1, blur_size=blur_size,
+                            scale=scale)
+    if engine == "frame":
+        return None  # сравнение с предыдущим кадром, встроено в MotionDetector
+    raise ValueError(f"Неизвестная модель фона {engine}, доступны: {', '.join(BACKGROUND_ENGINES)}")
@@ -0,0 +1,121 @@
+# motion_detection/capture.py
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# seq - сквозной номер кадра, timestamp - time.monotonic() момента чтения
+CapturedFrame = namedtuple("CapturedFrame", ["seq", "timestamp", "image"])
+
+# Как часто напоминать в логе, что источник не отдает кадры (сек)
+_FAILURE_REPORT_INTERVAL = 10
+
+
+# Читает кадры из источника в отдельном потоке в небольшой кольцевой буфер,
+# чтобы блокирующий cap.read() не останавливал цикл asyncio
+class FrameGrabber:
+    def __init__(self, cap, buffer_size=4, name="frame-grabber", failures_metric=None):
+        self.cap = cap
+        self.buffer = deque(maxlen=max(1, buffer_size))
+        self.name = name
+        self.lock = threading.Lock()
+        self.new_frame_event = threading.Event()
+        self.thread = None
+        self.is_running = False
+        self.seq = 0
+        self.last_consumed_seq = 0
+        self.dropped_frames = 0
+        self.read_failures = 0
+        # Счетчик неудачных чтений пополняется пачками: в начале и конце простоя и раз в _FAILURE_REPORT_INTERVAL
+        self.failures_metric = failures_metric
+        self.reported_failures = 0
+        self.failing_since = None
+        self.last_failure_report = 0.0
+        # Вызываются в потоке захвата для каждого кадра, должны быть быстрыми
+        self.listeners = []
+        # Вызываются без аргументов, когда появился новый кадр для анализа
+        self.wakers = []
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.is_running:
+            ret, image = self.cap.read()
+            if not ret:
+                if getattr(self.cap, "exhausted", False):
+                    logger.info(f"Источник {self.name} закончился.")
+                    break
+                self.read_failures += 1
+                self._on_read_failure()
+                time.sleep(0.01)
+                continue
+            timestamp = time.monotonic()
+            if self.failing_since is not None:
+                logger.info(f"Источник {self.name} снова отдает кадры после {timestamp - self.failing_since:.1f} сек "
+                            f"простоя.")
+                self.failing_since = None
+                self._report_failures(timestamp)
+            with self.lock:
+                self.seq += 1
+                captured = CapturedFrame(self.seq, timestamp, image)
+                self.buffer.append(captured)
+            for listener in self.listeners:
+                try:
+                    listener(captured)
+                except Exception as e:
+                    logger.error(f"Ошибка обработчика кадра в потоке {self.name}: {e}", exc_info=True)
+            self.new_frame_event.set()
+            for waker in self.wakers:
+                waker()
+        logger.info(f"Поток захвата {self.name} остановлен.")
+
+    # Отключенная камера просто перестает отдавать кадры - сообщаем об этом, а не молчим
+    def _on_read_failure(self):
+        now = time.monotonic()
+        if self.failing_since is None:
+            self.failing_since = now
+            logger.warning(f"Источник {self.name} не отдает кадры, ждем восстановления.")
+            self._report_failures(now)
+        elif now - self.last_failure_report >= _FAILURE_REPORT_INTERVAL:
+            logger.warning(f"Источник {self.name} не отдает кадры уже {now - self.failing_since:.0f} сек "
+                           f"(неудачных чтений: {self.read_failures}).")
+            self._report_failures(now)
+
+    def _report_failures(self, now):
+        self.last_failure_report = now
+        count = self.read_failures - self.reported_failures
+        self.reported_failures = self.read_failures
+        if count and self.failures_metric is not None:
+            self.failures_metric.inc(count)
+
+    # Новейший непрочитанный кадр и число кадров, пропущенных с прошлого вызова; не блокирует
+    def latest(self):
+        with self.lock:
+            if not self.buffer:
+                return None, 0
+            frame = self.buffer[-1]
+            if frame.seq <= self.last_consumed_seq:
+                return None, 0
+            dropped = frame.seq - self.last_consumed_seq - 1 if self.last_consumed_seq else 0
+            self.last_consumed_seq = frame.seq
+            self.dropped_frames += dropped
+            self.new_frame_event.clear()
+        return frame, dropped
+
+    def wait(self, timeout=None):
+        return self.new_frame_event.wait(timeout)
+
+    def stop(self):
+        self.is_running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=2)
+        self.thread = None
+        with self.lock:
+            self.buffer.clear()
@@ -1,109 +1,425 @@
 # motion_detection/detector.py
 import cv2
 import numpy as np
+import logging
+import threading
 import time
 import os
 from datetime import datetime
 
+from .capture import FrameGrabber
+from .preroll import PreRollBuffer
+from .recorder import VideoRecorder
+from .sources import open_source
+from .zones import DetectionZones
+from .background import BACKGROUND_ENGINES, create_background_model
+from monitoring import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_FRAMES = REGISTRY.counter("camera_frames", "Кадров получено с камеры")
+_DROPPED = REGISTRY.counter("camera_dropped_frames", "Кадров захвата, не попавших в анализ")
+_FPS = REGISTRY.gauge("camera_fps", "Частота кадров камеры")
+_READ_FAILURES = REGISTRY.counter("camera_read_failures", "Неудачных чтений кадра с камеры")
+_DETECT_SECONDS = REGISTRY.histogram("motion_detect_seconds", "Время анализа кадра на движение")
+_ENCODE_SECONDS = REGISTRY.histogram("encode_seconds", "Время кодирования медиа для отправки")
+
+# Окно усреднения частоты кадров камеры (сек)
+_FPS_WINDOW = 5.0
+DETECTION_MODES = ("full", "tiered")
+
 
 class MotionDetector:
-    def __init__(self, min_area=1000, frame_width=640, frame_height=480):
+    def __init__(self, min_area=1000, frame_width=640, frame_height=480, capture_buffer_size=4,
+                 mode="full", downscale=4, coarse_area_ratio=0.5,
+                 preroll_seconds=0, preroll_max_bytes=16 * 1024 * 1024, preroll_fps=15,
+                 video_queue_size=64, name=None, zones=None, background="frame", learning_rate=0.05):
+        # Опечатка в MOTION_DETECTION_MODE или MOTION_BACKGROUND не должна молча включать другой анализ
+        if mode not in DETECTION_MODES:
+            raise ValueError(f"Неизвестный режим детекции {mode}, доступны: {', '.join(DETECTION_MODES)}")
+        if background not in BACKGROUND_ENGINES:
+            raise ValueError(f"Неизвестная модель фона {background}, доступны: {', '.join(BACKGROUND_ENGINES)}")
         self.min_area = min_area
+        self.name = name  # имя камеры для файлов, когда камер несколько
+        self.mode = mode
+        # Параметры грубого прохода: площадь масштабируется вместе с кадром,
+        # а порог занижен, чтобы не пропустить то, что нашел бы полный анализ
+        self.downscale = max(1, downscale)
+        self.coarse_min_pixels = max(1, int(min_area * coarse_area_ratio / (self.downscale ** 2)))
+        self.coarse_blur_size = max(3, (21 // self.downscale) | 1)
+        self.previous_coarse_frame = None
+        self.previous_raw_frame = None
+        self.coarse_passes = 0
+        self.full_passes = 0
+        # Модель фона вместо сравнения с предыдущим кадром. В режиме tiered она работает
+        # на уменьшенном кадре и заменяет оба прохода.
+        self.background = background
+        self.learning_rate = learning_rate
+        self.background_model = create_background_model(
+            background, learning_rate=learning_rate,
+            blur_size=21 if mode == "full" else self.coarse_blur_size,
+            scale=1 if mode == "full" else self.downscale)
         self.frame_width = frame_width
         self.frame_height = frame_height
+        self.capture_buffer_size = capture_buffer_size
         self.cap = None
+        self.grabber = None
+        self.last_frame = None  # CapturedFrame последнего проанализированного кадра
+        self.last_dropped_frames = 0
+        camera = name or "cam1"
+        self._frames_metric = _FRAMES.labels(camera=camera)
+        self._dropped_metric = _DROPPED.labels(camera=camera)
+        self._fps_metric = _FPS.labels(camera=camera)
+        self._read_failures_metric = _READ_FAILURES.labels(camera=camera)
+        self._detect_metric = _DETECT_SECONDS.labels(camera=camera)
+        self._fps_window = (0, 0.0)  # (номер кадра, время) начала окна
         self.previous_frame = None
         self.is_running = False
         self.video_writer = None
-        self.video_filename = None
+        self.video_filename = None  # файл текущей части записи
+        self.video_basename = None
+        self.video_fps = 15
+        self.segment_seconds = 0
+        self.segment_listener = None
+        self.video_queue_size = video_queue_size
+        self.recorder = None
+        self.last_recording_stats = None
+        # Пре-запись: кадры до срабатывания, которые попадут в начало видео
+        self.preroll = None
+        if preroll_seconds > 0:
+            self.preroll = PreRollBuffer(seconds=preroll_seconds, max_bytes=preroll_max_bytes, fps=preroll_fps)
+        self.preroll_active = False
+        # Поток захвата выбирает, куда отдать кадр (запись или пре-запись), под этой блокировкой:
+        # при старте записи ни один кадр не застрянет в пре-записи между drain() и появлением recorder
+        self.route_lock = threading.Lock()
+        # Вызываются с (путь, тип) для каждого сохраненного файла: "photo" или "video"
+        self.file_listeners = []
+        self.zones = None
+        self.coarse_mask = None  # (исходная маска, маска грубого прохода)
+        self.set_zones(zones)
 
     def start_capture(self, camera_index=0):
-        self.cap = cv2.VideoCapture(camera_index)
+        # Кроме индекса камеры и URL можно передать файл, каталог кадров или "synthetic:<сценарий>"
+        source = open_source(camera_index, width=self.frame_width, height=self.frame_height, realtime=True)
+        self.cap = source if source is not None else cv2.VideoCapture(camera_index)
         if not self.cap.isOpened():
             return False
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_width)
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_height)
-        self.previous_frame = self._get_processed_frame()
+        self.previous_frame = None
+        self.previous_coarse_frame = None
+        self.previous_raw_frame = None
+        if self.background_model is not None:
+            self.background_model.reset()
+        self.grabber = FrameGrabber(self.cap, buffer_size=self.capture_buffer_size,
+                                    name=f"capture-{self.name or camera_index}",
+                                    failures_metric=self._read_failures_metric)
+        self.grabber.listeners.append(self._on_captured_frame)
+        self.grabber.start()
         self.is_running = True
         return True
 
-    def _get_processed_frame(self):
-        if not self.cap or not self.cap.isOpened():
-            return None
-        ret, frame = self.cap.read()
-        if not ret:
-            return None
+    # Локальный детектор анализирует кадры только при вызове detect_motion,
+    # поэтому частотой и включением анализа управляет вызывающий код
+    def set_analysis_enabled(self, enabled):
+        pass
+
+    def set_analysis_interval(self, seconds):
+        pass
+
+    # Зоны детекции: DetectionZones, словарь {"include": [...], "exclude": [...]} или None - весь кадр
+    def set_zones(self, zones):
+        if isinstance(zones, dict):
+            zones = DetectionZones.from_dict(zones)
+        self.zones = zones if zones is not None and not zones.is_empty else None
+        self.coarse_mask = None
+        # Размер обрабатываемой области мог измениться, старые кадры сравнивать не с чем,
+        # а фон, выученный под старой маской, сразу после смены зон дал бы ложное движение
+        self.previous_frame = None
+        self.previous_coarse_frame = None
+        self.previous_raw_frame = None
+        if self.background_model is not None:
+            self.background_model.reset()
+
+    # Часть кадра внутри рамки зон, маска этой части (или None) и смещение рамки
+    def _zone_view(self, frame):
+        if self.zones is None:
+            return frame, None, (0, 0)
+        height, width = frame.shape[:2]
+        mask, (x, y, w, h) = self.zones.mask(width, height)
+        return frame[y:y + h, x:x + w], mask, (x, y)
+
+    def _get_coarse_mask(self, mask, coarse_shape):
+        if self.coarse_mask is None or self.coarse_mask[0] is not mask or self.coarse_mask[1].shape != coarse_shape:
+            coarse = cv2.resize(mask, (coarse_shape[1], coarse_shape[0]), interpolation=cv2.INTER_NEAREST)
+            self.coarse_mask = (mask, coarse)
+        return self.coarse_mask[1]
+
+    def _on_captured_frame(self, captured):
+        # Вызывается в потоке захвата: во время записи в видео идет каждый кадр,
+        # а не только кадры с движением; иначе кадры копятся в пре-записи
+        with self.route_lock:
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.submit(captured.timestamp, captured.image)
+            elif self.preroll and self.preroll_active:
+                self.preroll.push(captured.timestamp, captured.image)
+
+    def _get_processed_frame(self, frame):
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         gray_blurred = cv2.GaussianBlur(gray, (21, 21), 0)
         return gray_blurred
 
-    def detect_motion(self):
-        if not self.is_running or self.previous_frame is None:
-            return None
+    def _get_coarse_frame(self, frame):
+        # Прореживание без интерполяции почти бесплатно, сглаживание дает последующий blur
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, width // self.downscale), max(1, height // self.downscale)),
+                           interpolation=cv2.INTER_NEAREST)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (self.coarse_blur_size, self.coarse_blur_size), 0)
 
-        ret, original_frame = self.cap.read()
-        if not ret:
-            return None
+    @property
+    def dropped_frames(self):
+        return self.grabber.dropped_frames if self.grabber else 0
 
-        current_processed_frame = cv2.cvtColor(original_frame, cv2.COLOR_BGR2GRAY)
-        current_processed_frame = cv2.GaussianBlur(current_processed_frame, (21, 21), 0)
-
-        frame_delta = cv2.absdiff(self.previous_frame, current_processed_frame)
+    # Рамки (x, y, w, h) контуров движения площадью больше min_area в координатах всего кадра
+    def _find_motion_regions(self, previous_processed, current_processed, mask=None, offset=(0, 0)):
+        frame_delta = cv2.absdiff(previous_processed, current_processed)
         thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
+        if mask is not None:
+            thresh = cv2.bitwise_and(thresh, mask)
         thresh = cv2.dilate(thresh, None, iterations=2)
-        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
-        self.previous_frame = current_processed_frame
+        return self._regions_from_contours(contours, offset)
 
-        motion_detected_this_frame = False
+    def _regions_from_contours(self, contours, offset, scale=1):
+        dx, dy = offset
+        min_area = self.min_area / (scale * scale)
+        regions = []
         for contour in contours:
-            if cv2.contourArea(contour) > self.min_area:
-                motion_detected_this_frame = True
-                break
+            if cv2.contourArea(contour) > min_area:
+                x, y, w, h = cv2.boundingRect(contour)
+                regions.append((int(x * scale + dx), int(y * scale + dy), int(w * scale), int(h * scale)))
+        return regions
 
-        if motion_detected_this_frame:
-            return original_frame
-        return None
+    def _analyze_background(self, frame):
+        view, mask, offset = self._zone_view(frame)
+        model = self.background_model
+        if mask is not None and model.scale > 1:
+            height, width = view.shape[:2]
+            mask = self._get_coarse_mask(mask, (max(1, height // model.scale), max(1, width // model.scale)))
+        foreground = model.foreground(view, mask)
+        if foreground is None:
+            return []
+        contours, _ = cv2.findContours(foreground, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return self._regions_from_contours(contours, offset, model.scale)
 
-    def capture_screenshot(self, frame, directory="screenshots"):
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        filename = os.path.join(directory, f"motion_{timestamp}.jpg")
-        cv2.imwrite(filename, frame)
+    def _analyze_full(self, frame):
+        # Размытие и разность считаются только внутри рамки зон
+        view, mask, offset = self._zone_view(frame)
+        current_processed_frame = self._get_processed_frame(view)
+        if self.previous_frame is None:
+            self.previous_frame = current_processed_frame
+            return []
+
+        regions = self._find_motion_regions(self.previous_frame, current_processed_frame, mask, offset)
+        self.previous_frame = current_processed_frame
+        return regions
+
+    def _analyze_tiered(self, frame):
+        # Дешевый проход: кадр в 1/downscale, подсчет изменившихся пикселей без контуров
+        view, mask, offset = self._zone_view(frame)
+        current_coarse = self._get_coarse_frame(view)
+        previous_coarse = self.previous_coarse_frame
+        previous_raw = self.previous_raw_frame
+        previous_processed = self.previous_frame
+        self.previous_coarse_frame = current_coarse
+        self.previous_raw_frame = view
+        self.previous_frame = None
+        if previous_coarse is None:
+            return []
+
+        frame_delta = cv2.absdiff(previous_coarse, current_coarse)
+        thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
+        if mask is not None:
+            thresh = cv2.bitwise_and(thresh, self._get_coarse_mask(mask, thresh.shape))
+        self.coarse_passes += 1
+        if cv2.countNonZero(thresh) < self.coarse_min_pixels:
+            return []
+
+        # Грубый проход сработал: подтверждаем полным анализом контуров.
+        # Обработанный предыдущий кадр есть только если полный проход шел и на нем.
+        self.full_passes += 1
+        if previous_processed is None:
+            previous_processed = self._get_processed_frame(previous_raw)
+        current_processed = self._get_processed_frame(view)
+        self.previous_frame = current_processed
+        return self._find_motion_regions(previous_processed, current_processed, mask, offset)
+
+    # Список рамок движения; пустой список - движения нет
+    def analyze_frame(self, frame):
+        if self.background_model is not None:
+            return self._analyze_background(frame)
+        if self.mode == "tiered":
+            return self._analyze_tiered(frame)
+        return self._analyze_full(frame)
+
+    # Возвращает (кадр, рамки движения) или (None, []), если движения нет
+    def detect_motion(self):
+        if not self.is_running or not self.grabber:
+            return None, []
+
+        # Берем самый свежий кадр из буфера потока захвата, не дожидаясь камеры
+        captured, dropped = self.grabber.latest()
+        if captured is None:
+            return None, []
+        self._count_frame(captured, dropped)
+
+        original_frame = captured.image
+        started = time.perf_counter()
+        regions = self.analyze_frame(original_frame)
+        self._detect_metric.observe(time.perf_counter() - started)
+        if regions:
+            return original_frame, regions
+        return None, []
+
+    def _count_frame(self, captured, dropped):
+        previous = self.last_frame.seq if self.last_frame is not None else captured.seq - 1
+        self.last_frame = captured
+        self.last_dropped_frames = dropped
+        if captured.seq > previous:
+            self._frames_metric.inc(captured.seq - previous)
+        if dropped:
+            self._dropped_metric.inc(dropped)
+        window_seq, window_start = self._fps_window
+        elapsed = captured.timestamp - window_start
+        if elapsed >= _FPS_WINDOW:
+            if window_start:
+                self._fps_metric.set(round((captured.seq - window_seq) / elapsed, 1))
+            self._fps_window = (captured.seq, captured.timestamp)
+
+    def _notify_file_saved(self, path, kind):
+        for listener in self.file_listeners:
+            try:
+                listener(path, kind)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика сохраненного файла {path}: {e}", exc_info=True)
+
+    def _file_tag(self):
+        return f"{self.name}_" if self.name else ""
+
+    # JPEG кодируется один раз в памяти: эти же байты уходят в Telegram и, при необходимости, на диск
+    # captured_at - время съемки кадра (time.time()), если кадр кодируется позже
+    def encode_screenshot(self, frame, captured_at=None):
+        moment = datetime.fromtimestamp(captured_at) if captured_at is not None else datetime.now()
+        timestamp = moment.strftime("%Y%m%d_%H%M%S_%f")
+        started = time.perf_counter()
+        ok, encoded = cv2.imencode(".jpg", frame)
+        _ENCODE_SECONDS.labels(kind="jpeg").observe(time.perf_counter() - started)
+        if not ok:
+            return None, None
+        return f"motion_{self._file_tag()}{timestamp}.jpg", encoded.tobytes()
+
+    def save_screenshot(self, name, data, directory="screenshots"):
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, name)
+        try:
+            with open(filename, "wb") as f:
+                f.write(data)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить скриншот {filename}: {e}")
+            return None
+        self._notify_file_saved(filename, "photo")
         return filename
 
-    def start_video_recording(self, directory="motion_videos", fps=10):
+    def capture_screenshot(self, frame, directory="screenshots"):
+        name, data = self.encode_screenshot(frame)
+        if data is None:
+            return None
+        return self.save_screenshot(name, data, directory)
+
+    def _segment_path(self, index):
+        if self.segment_seconds <= 0:
+            return f"{self.video_basename}.mp4"
+        return f"{self.video_basename}_{index:03d}.mp4"
+
+    def _open_segment(self, index):
+        # Вызывается в потоке записи при переходе к следующей части
+        self.video_filename = self._segment_path(index)
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # или 'XVID' для .avi
+        self.video_writer = cv2.VideoWriter(self.video_filename, fourcc, self.video_fps,
+                                            (self.frame_width, self.frame_height))
+        if not self.video_writer.isOpened():
+            logger.error(f"Не удалось открыть файл части видео {self.video_filename}")
+        return self.video_writer
+
+    def _segment_finished(self, index):
+        path = self._segment_path(index)
+        self._notify_file_saved(path, "video")
+        if self.segment_listener:
+            self.segment_listener(path, index)
+
+    # segment_seconds > 0 - запись частями такой длины; on_segment(путь, номер) вызывается
+    # в потоке записи для каждой закрытой части, кроме последней (ее возвращает stop_video_recording)
+    def start_video_recording(self, directory="motion_videos", fps=10, segment_seconds=0, on_segment=None):
         if not os.path.exists(directory):
             os.makedirs(directory)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.video_filename = os.path.join(directory, f"video_{timestamp}.mp4")
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # или 'XVID' для .avi
-        self.video_writer = cv2.VideoWriter(self.video_filename, fourcc, fps, (self.frame_width, self.frame_height))
-        if self.video_writer.isOpened():
+        self.video_basename = os.path.join(directory, f"video_{self._file_tag()}{timestamp}")
+        self.video_fps = fps
+        self.segment_seconds = segment_seconds
+        self.segment_listener = on_segment
+        frame_size = (self.frame_width, self.frame_height)
+        if self._open_segment(0).isOpened():
+            # Пре-запись пишется первой в потоке записи, живые кадры встают за ней по меткам времени
+            with self.route_lock:
+                initial_frames = self.preroll.drain() if self.preroll else None
+                self.recorder = VideoRecorder(self.video_writer, fps, frame_size,
+                                              queue_size=self.video_queue_size, initial_frames=initial_frames,
+                                              segment_frames=int(segment_seconds * fps),
+                                              open_segment=self._open_segment, on_segment=self._segment_finished)
+            self.recorder.start()
             return self.video_filename
         else:
             self.video_writer = None
             self.video_filename = None
             return None
 
-    def write_video_frame(self, frame):
-        if self.video_writer and self.video_writer.isOpened():
-            self.video_writer.write(frame)
-            return True
+    def preroll_stats(self):
+        return self.preroll.stats() if self.preroll else None
+
+    def recording_stats(self):
+        return self.recorder.stats() if self.recorder else self.last_recording_stats
+
+    # Кадры с камеры попадают в запись сами; метод нужен для кадров из других источников
+    def write_video_frame(self, frame, timestamp=None):
+        if self.recorder:
+            return self.recorder.submit(time.monotonic() if timestamp is None else timestamp, frame)
         return False
 
     def stop_video_recording(self):
-        if self.video_writer:
-            self.video_writer.release()
+        if self.recorder:
+            recorder = self.recorder
+            self.recorder = None
+            recorder.stop()
+            self.last_recording_stats = recorder.stats()
             self.video_writer = None
+            self._notify_file_saved(self.video_filename, "video")
             return self.video_filename
         return None
 
     def stop_capture(self):
-        if self.video_writer:
+        if self.recorder:
             self.stop_video_recording()
+        if self.grabber:
+            self.grabber.stop()
+            self.grabber = None
+        if self.preroll:
+            self.preroll.clear()
         if self.cap:
             self.cap.release()
         self.is_running = False
         self.previous_frame = None
+        self.previous_coarse_frame = None
+        self.previous_raw_frame = None
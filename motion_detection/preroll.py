@@ -0,0 +1,90 @@
+# motion_detection/preroll.py
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+# Буфер последних секунд кадров до срабатывания детектора.
+# Кадры хранятся в памяти в виде JPEG, чтобы на ARM-устройствах занимать мало ОЗУ.
+class PreRollBuffer:
+    def __init__(self, seconds=3, max_bytes=16 * 1024 * 1024, fps=15, jpeg_quality=80):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.min_interval = 1.0 / fps if fps > 0 else 0
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), jpeg_quality]
+        self.frames = deque()  # (timestamp, jpeg_bytes)
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.encoded_frames = 0
+        self.evicted_frames = 0
+        self.encode_time_total = 0.0
+        self.decode_time_total = 0.0
+
+    def push(self, timestamp, image):
+        # Храним не чаще частоты видео: лишние кадры все равно не попадут в ролик
+        with self.lock:
+            if self.frames and timestamp - self.frames[-1][0] < self.min_interval:
+                return False
+
+        started = time.perf_counter()
+        ok, encoded = cv2.imencode(".jpg", image, self.encode_params)
+        elapsed = time.perf_counter() - started
+        if not ok:
+            return False
+        data = encoded.tobytes()
+
+        with self.lock:
+            self.encode_time_total += elapsed
+            self.encoded_frames += 1
+            self.frames.append((timestamp, data))
+            self.total_bytes += len(data)
+            self._evict(timestamp)
+        return True
+
+    def _evict(self, now):
+        while self.frames and (now - self.frames[0][0] > self.seconds or self.total_bytes > self.max_bytes):
+            _, data = self.frames.popleft()
+            self.total_bytes -= len(data)
+            self.evicted_frames += 1
+
+    # Забирает из буфера кадры, снятые до момента before, и очищает его.
+    # Кадры декодируются по одному при итерации, чтобы не держать в памяти весь ролик.
+    def drain(self, before=None):
+        with self.lock:
+            frames = list(self.frames)
+            self.frames.clear()
+            self.total_bytes = 0
+        return self._decode(frames, before)
+
+    def _decode(self, frames, before):
+        for timestamp, data in frames:
+            if before is not None and timestamp >= before:
+                break
+            started = time.perf_counter()
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            self.decode_time_total += time.perf_counter() - started
+            if image is not None:
+                yield timestamp, image
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            frame_count = len(self.frames)
+            span = self.frames[-1][0] - self.frames[0][0] if frame_count > 1 else 0.0
+            return {
+                "frames": frame_count,
+                "bytes": self.total_bytes,
+                "seconds": round(span, 2),
+                "encoded_frames": self.encoded_frames,
+                "evicted_frames": self.evicted_frames,
+                "avg_encode_ms": round(self.encode_time_total / self.encoded_frames * 1000, 3)
+                if self.encoded_frames else 0.0,
+                "decode_ms_total": round(self.decode_time_total * 1000, 3),
+            }
@@ -0,0 +1,133 @@
+# motion_detection/recorder.py
+import logging
+import queue
+import threading
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+# Запись видео в отдельном потоке с постоянной частотой кадров.
+# Кадры приходят с метками времени захвата; поток раскладывает их на сетку fps,
+# дублируя кадр при пропусках и отбрасывая лишние, чтобы ролик шел в реальном темпе.
+# При segment_frames > 0 запись режется на части: после segment_frames кадров файл закрывается,
+# вызывается on_segment(номер части), а open_segment(номер следующей части) возвращает новый VideoWriter.
+class VideoRecorder:
+    def __init__(self, writer, fps, frame_size, queue_size=64, initial_frames=None, max_gap_seconds=2.0,
+                 segment_frames=0, open_segment=None, on_segment=None):
+        self.writer = writer
+        self.segment_frames = segment_frames if open_segment else 0
+        self.open_segment = open_segment
+        self.on_segment = on_segment
+        self.segment_index = 0
+        self.segment_written = 0
+        self.fps = fps
+        self.frame_size = frame_size  # (ширина, высота), как у VideoWriter
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.initial_frames = initial_frames  # итератор (timestamp, image), пишется первым
+        self.max_duplicates = max(1, int(max_gap_seconds * fps))
+        self.thread = threading.Thread(target=self._run, name="video-recorder", daemon=True)
+        self.start_timestamp = None
+        self.next_index = 0
+        self.last_image = None
+        self.written_frames = 0
+        self.duplicated_frames = 0
+        self.timeline_dropped_frames = 0
+        self.dropped_frames = 0  # отброшены из-за переполнения очереди
+
+    def start(self):
+        self.thread.start()
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def submit(self, timestamp, image):
+        try:
+            self.queue.put_nowait((timestamp, image))
+            return True
+        except queue.Full:
+            self.dropped_frames += 1
+            return False
+
+    def _rotate(self):
+        # Часть закрывается перед первым кадром следующей, поэтому пустых файлов не бывает
+        self.writer.release()
+        if self.on_segment:
+            try:
+                self.on_segment(self.segment_index)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика готовой части видео: {e}", exc_info=True)
+        self.segment_index += 1
+        self.segment_written = 0
+        self.writer = self.open_segment(self.segment_index)
+
+    def _write(self, image):
+        if self.segment_frames and self.segment_written >= self.segment_frames:
+            self._rotate()
+        if (image.shape[1], image.shape[0]) != self.frame_size:
+            image = cv2.resize(image, self.frame_size)
+        self.writer.write(image)
+        self.written_frames += 1
+        self.segment_written += 1
+        return image
+
+    def _write_timed(self, timestamp, image):
+        if self.start_timestamp is None:
+            self.start_timestamp = timestamp
+        index = int(round((timestamp - self.start_timestamp) * self.fps))
+        if index < self.next_index:
+            self.timeline_dropped_frames += 1
+            return
+
+        gap = index - self.next_index
+        if gap > self.max_duplicates:
+            # Долгий простой камеры: не растягиваем ролик, а сдвигаем сетку
+            self.start_timestamp += (gap - self.max_duplicates) / self.fps
+            index -= gap - self.max_duplicates
+            gap = self.max_duplicates
+        if gap and self.last_image is not None:
+            for _ in range(gap):
+                self._write(self.last_image)
+                self.duplicated_frames += 1
+
+        self.last_image = self._write(image)
+        self.next_index = index + 1
+
+    def _run(self):
+        try:
+            if self.initial_frames is not None:
+                for timestamp, image in self.initial_frames:
+                    self._write_timed(timestamp, image)
+                self.initial_frames = None
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    break
+                self._write_timed(*item)
+        except Exception as e:
+            logger.error(f"Ошибка в потоке записи видео: {e}", exc_info=True)
+
+    def stop(self):
+        # Дописываем все, что уже в очереди, и закрываем файл
+        while self.thread.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self.thread.join()
+        self.writer.release()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "written_frames": self.written_frames,
+            "duplicated_frames": self.duplicated_frames,
+            "timeline_dropped_frames": self.timeline_dropped_frames,
+            "dropped_frames": self.dropped_frames,
+            "segments": self.segment_index + 1,
+        }
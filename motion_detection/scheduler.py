@@ -0,0 +1,89 @@
+# motion_detection/scheduler.py
+import asyncio
+import time
+
+
+# Адаптивный планировщик анализа кадров вместо фиксированной паузы основного цикла.
+# В тихой сцене кадры анализируются с частотой idle_fps, при движении - каждый кадр
+# камеры (или с active_fps), и так еще hold_seconds после последнего движения.
+# Цикл просыпается по сигналу потока захвата, когда подошло время следующего анализа.
+class AdaptiveScheduler:
+    def __init__(self, idle_fps=2.0, active_fps=0, hold_seconds=5.0, max_wait=1.0):
+        self.idle_interval = 1.0 / idle_fps if idle_fps > 0 else 0.0
+        self.active_interval = 1.0 / active_fps if active_fps > 0 else 0.0
+        self.hold_seconds = hold_seconds
+        self.max_wait = max_wait  # даже без кадров цикл просыпается, чтобы вовремя остановить запись
+        self.loop = None
+        self.event = asyncio.Event()
+        self.detectors = []
+        self.active = False
+        self.last_motion_time = 0.0
+        self.next_due = 0.0
+        self.window_started = time.monotonic()
+        self.busy_time = 0.0
+        self.analyses = 0
+        self.active_time = 0.0
+        self.last_state_change = self.window_started
+
+    def attach(self, detector):
+        self.loop = asyncio.get_running_loop()
+        self.detectors.append(detector)
+        if detector.grabber is not None:
+            detector.grabber.wakers.append(self._on_frame)
+        detector.set_analysis_interval(self.interval)
+
+    @property
+    def interval(self):
+        return self.active_interval if self.active else self.idle_interval
+
+    def _on_frame(self):
+        # Вызывается из потока захвата: будим цикл, только если пора анализировать
+        if time.monotonic() >= self.next_due and self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self):
+        try:
+            await asyncio.wait_for(self.event.wait(), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+
+    def _set_active(self, active, now):
+        if active == self.active:
+            return
+        if self.active:
+            self.active_time += now - self.last_state_change
+        self.last_state_change = now
+        self.active = active
+        for detector in self.detectors:
+            detector.set_analysis_interval(self.interval)
+
+    # Итог одного прохода по камерам: было ли движение и сколько времени занял анализ
+    def record(self, motion, busy_seconds):
+        now = time.monotonic()
+        self.analyses += 1
+        self.busy_time += busy_seconds
+        if motion:
+            self.last_motion_time = now
+            self._set_active(True, now)
+        elif self.active and now - self.last_motion_time > self.hold_seconds:
+            self._set_active(False, now)
+        self.next_due = now + self.interval
+
+    def stats(self, reset=False):
+        now = time.monotonic()
+        elapsed = max(1e-6, now - self.window_started)
+        active_time = self.active_time + (now - self.last_state_change if self.active else 0.0)
+        result = {
+            "mode": "active" if self.active else "idle",
+            "analyses_per_second": round(self.analyses / elapsed, 2),
+            "duty_cycle": round(self.busy_time / elapsed, 4),
+            "active_share": round(active_time / elapsed, 4),
+        }
+        if reset:
+            self.window_started = now
+            self.last_state_change = now
+            self.busy_time = 0.0
+            self.active_time = 0.0
+            self.analyses = 0
+        return result
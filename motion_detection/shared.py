@@ -0,0 +1,415 @@
+# motion_detection/shared.py
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from .capture import CapturedFrame
+from .detector import MotionDetector
+
+logger = logging.getLogger(__name__)
+
+
+# Кольцо слотов кадров в разделяемой памяти.
+# Раскладка: seq слотов (int64), метки времени (float64), затем сами кадры.
+# Пока слот пишется, его seq равен -1, поэтому читатель замечает перезапись.
+class SharedFrameRing:
+    def __init__(self, buf, slots, shape):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.seqs = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=0)
+        self.timestamps = np.ndarray((slots,), dtype=np.float64, buffer=buf, offset=8 * slots)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=buf, offset=16 * slots)
+
+    @staticmethod
+    def size(slots, shape):
+        return 16 * slots + slots * int(np.prod(shape))
+
+    def write(self, seq, timestamp, image):
+        slot = seq % self.slots
+        self.seqs[slot] = -1
+        self.frames[slot][...] = image
+        self.timestamps[slot] = timestamp
+        self.seqs[slot] = seq
+        return slot
+
+    def read(self, slot, seq):
+        if self.seqs[slot] != seq:
+            return None
+        image = self.frames[slot].copy()
+        if self.seqs[slot] != seq:
+            return None  # слот перезаписан во время копирования
+        return image
+
+    def release(self):
+        # Представления numpy держат буфер; их нужно отпустить до shm.close()
+        self.seqs = self.timestamps = self.frames = None
+
+
+# Метрики процесса камеры не экспортируются: неудачные чтения пересылаются основному процессу
+class _ForwardedCounter:
+    def __init__(self, events, kind):
+        self.events = events
+        self.kind = kind
+
+    def inc(self, amount=1):
+        self.events.put((self.kind, amount))
+
+
+def camera_worker(source, settings, shm_name, slots, shape, events, commands, analysis_enabled,
+                  analysis_interval, stop_event):
+    # Точка входа процесса камеры: захват и детекция, кадры уходят в разделяемую память,
+    # а в очередь событий - только короткие сообщения
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s - %(levelname)s - %(processName)s - %(name)s - %(message)s")
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = SharedFrameRing(shm.buf, slots, shape)
+    detector = MotionDetector(**settings)
+
+    def publish(captured):
+        image = captured.image
+        if image.shape != ring.shape:
+            image = cv2.resize(image, (ring.shape[1], ring.shape[0]))
+        slot = ring.write(captured.seq, captured.timestamp, image)
+        events.put(("frame", captured.seq, slot, captured.timestamp))
+
+    try:
+        if not detector.start_capture(camera_index=source):
+            events.put(("started", False))
+            return
+        detector.grabber.listeners.append(publish)
+        detector.grabber.failures_metric = _ForwardedCounter(events, "read_failures")
+        events.put(("started", True))
+
+        while not stop_event.is_set():
+            # Команды основного процесса: пока только замена зон детекции
+            try:
+                while True:
+                    command, payload = commands.get_nowait()
+                    if command == "zones":
+                        detector.set_zones(payload)
+            except queue.Empty:
+                pass
+            if not detector.grabber.wait(0.5):
+                continue
+            if not analysis_enabled.is_set():
+                detector.grabber.latest()
+                continue
+            started = time.monotonic()
+            analysis_started = time.perf_counter()
+            _, regions = detector.detect_motion()
+            # Метрики процесса камеры не экспортируются, время анализа уходит основному процессу
+            elapsed = time.perf_counter() - analysis_started
+            if detector.last_frame is not None:
+                height, width = detector.last_frame.image.shape[:2]
+                if (height, width) != ring.shape[:2]:
+                    # Кадр в разделяемой памяти приведен к размеру кольца, рамки - тоже
+                    sx, sy = ring.shape[1] / width, ring.shape[0] / height
+                    regions = [(int(x * sx), int(y * sy), int(w * sx), int(h * sy)) for x, y, w, h in regions]
+                events.put(("motion", detector.last_frame.seq, regions, elapsed))
+            # В тихой сцене основной процесс просит анализировать реже
+            delay = analysis_interval.value - (time.monotonic() - started)
+            if delay > 0:
+                stop_event.wait(delay)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detector.stop_capture()
+        ring.release()
+        shm.close()
+
+
+# Читает сообщения процесса камеры и копирует кадры из разделяемой памяти.
+# Повторяет интерфейс FrameGrabber, поэтому запись, пре-запись и main_loop работают как с локальной камерой.
+# Каждый кадр копируется, только пока он нужен обработчикам (wants_frames - запись или пре-запись),
+# иначе копируется лишь кадр вердикта с движением: слоты кольца хранят его до прихода вердикта.
+class SharedFrameReader:
+    def __init__(self, events, ring, buffer_size=4, name="shared-reader", detect_metric=None,
+                 failures_metric=None):
+        self.events = events
+        self.ring = ring
+        self.buffer = deque(maxlen=max(1, buffer_size))
+        self.name = name
+        self.lock = threading.Lock()
+        self.new_frame_event = threading.Event()
+        self.thread = None
+        self.is_running = False
+        self.listeners = []
+        self.wakers = []
+        self.wants_frames = None  # функция без аргументов: нужны ли обработчикам все кадры
+        self.pending = deque(maxlen=ring.slots)  # (seq, слот, время) кадров, оставленных в кольце
+        self.latest_verdict = None  # (seq, рамки движения, CapturedFrame или None) последнего вердикта
+        self.last_consumed_seq = 0
+        self.dropped_frames = 0
+        self.overwritten_frames = 0
+        self.unmatched_verdicts = 0  # вердикты, чей кадр уже перезаписан в кольце
+        self.detect_metric = detect_metric  # гистограмма времени анализа в процессе камеры
+        self.failures_metric = failures_metric  # счетчик неудачных чтений камеры
+        self.read_failures = 0
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.is_running:
+            try:
+                message = self.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            if message[0] == "frame":
+                _, seq, slot, timestamp = message
+                if not self.listeners or (self.wants_frames is not None and not self.wants_frames()):
+                    with self.lock:
+                        self.pending.append((seq, slot, timestamp))
+                    continue
+                image = self.ring.read(slot, seq)
+                if image is None:
+                    self.overwritten_frames += 1
+                    continue
+                captured = CapturedFrame(seq, timestamp, image)
+                with self.lock:
+                    self.buffer.append(captured)
+                for listener in self.listeners:
+                    try:
+                        listener(captured)
+                    except Exception as e:
+                        logger.error(f"Ошибка обработчика кадра в потоке {self.name}: {e}", exc_info=True)
+            elif message[0] == "motion":
+                _, seq, regions, elapsed = message
+                # Учитывается каждый анализ, даже если вердикт затем перекроет следующий
+                if self.detect_metric is not None:
+                    self.detect_metric.observe(elapsed)
+                captured = self._verdict_frame(seq, regions)
+                with self.lock:
+                    self.latest_verdict = (seq, regions, captured)
+                self.new_frame_event.set()
+                for waker in self.wakers:
+                    waker()
+            elif message[0] == "read_failures":
+                self.read_failures += message[1]
+                if self.failures_metric is not None:
+                    self.failures_metric.inc(message[1])
+
+    # Кадр вердикта: из буфера, если кадры уже копируются, иначе из слота кольца.
+    # Изображение нужно только при движении, для вердикта без движения хватает номера и времени.
+    def _verdict_frame(self, seq, regions):
+        with self.lock:
+            captured = next((frame for frame in reversed(self.buffer) if frame.seq == seq), None)
+            if captured is not None:
+                return captured
+            entry = next((entry for entry in reversed(self.pending) if entry[0] == seq), None)
+        if entry is None:
+            return None
+        _, slot, timestamp = entry
+        if not regions:
+            return CapturedFrame(seq, timestamp, None)
+        image = self.ring.read(slot, seq)
+        if image is None:
+            self.overwritten_frames += 1
+            return None
+        return CapturedFrame(seq, timestamp, image)
+
+    # Кадр последнего вердикта детектора, рамки движения и число пропущенных вердиктов.
+    # Если кадр вердикта уже перезаписан, вердикт отбрасывается и считается пропущенным:
+    # рамки другого кадра не совпали бы с изображением.
+    def latest_result(self):
+        with self.lock:
+            if self.latest_verdict is None:
+                return None, [], 0
+            seq, regions, captured = self.latest_verdict
+            if seq <= self.last_consumed_seq:
+                return None, [], 0
+            dropped = seq - self.last_consumed_seq - 1 if self.last_consumed_seq else 0
+            self.last_consumed_seq = seq
+            self.new_frame_event.clear()
+            if captured is None:
+                self.unmatched_verdicts += 1
+                dropped += 1
+            self.dropped_frames += dropped
+        if captured is None:
+            return None, [], dropped
+        return captured, regions, dropped
+
+    def discard_verdict(self):
+        with self.lock:
+            self.latest_verdict = None
+            self.new_frame_event.clear()
+
+    def latest(self):
+        captured, _, dropped = self.latest_result()
+        return captured, dropped
+
+    def wait(self, timeout=None):
+        return self.new_frame_event.wait(timeout)
+
+    def stop(self):
+        self.is_running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=2)
+        self.thread = None
+        with self.lock:
+            self.buffer.clear()
+            self.pending.clear()
+
+
+# Детектор, у которого захват и анализ кадров идут в отдельном процессе.
+# Запись видео, пре-запись и скриншоты остаются в основном процессе.
+class ProcessMotionDetector(MotionDetector):
+    def __init__(self, slots=8, start_timeout=15, **kwargs):
+        self.commands = None
+        super().__init__(**kwargs)
+        self.slots = slots
+        self.start_timeout = start_timeout
+        self.process = None
+        self.shm = None
+        self.ring = None
+        self.events = None
+        self.analysis_enabled = None
+        self.analysis_interval = None
+        self.stop_event = None
+
+    def _worker_settings(self):
+        return {
+            "min_area": self.min_area,
+            "frame_width": self.frame_width,
+            "frame_height": self.frame_height,
+            "capture_buffer_size": self.capture_buffer_size,
+            "mode": self.mode,
+            "downscale": self.downscale,
+            "name": self.name,
+            "zones": self.zones.to_dict() if self.zones else None,
+            "background": self.background,
+            "learning_rate": self.learning_rate,
+        }
+
+    def start_capture(self, camera_index=0):
+        # spawn, а не fork: в основном процессе уже работают потоки и цикл asyncio
+        context = multiprocessing.get_context("spawn")
+        shape = (self.frame_height, self.frame_width, 3)
+        self.shm = shared_memory.SharedMemory(create=True, size=SharedFrameRing.size(self.slots, shape))
+        self.ring = SharedFrameRing(self.shm.buf, self.slots, shape)
+        self.ring.seqs[:] = 0
+        self.events = context.Queue()
+        self.commands = context.Queue()
+        self.analysis_enabled = context.Event()
+        self.analysis_enabled.set()
+        self.analysis_interval = context.Value("d", 0.0, lock=False)
+        self.stop_event = context.Event()
+        self.process = context.Process(
+            target=camera_worker,
+            args=(camera_index, self._worker_settings(), self.shm.name, self.slots, shape,
+                  self.events, self.commands, self.analysis_enabled, self.analysis_interval, self.stop_event),
+            name=f"camera-{self.name or camera_index}",
+            daemon=True,
+        )
+        self.process.start()
+
+        started = False
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline and self.process.is_alive():
+            try:
+                message = self.events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if message[0] == "started":
+                started = message[1]
+                break
+        if not started:
+            logger.error(f"Процесс камеры {camera_index} не смог открыть источник.")
+            self.stop_capture()
+            return False
+
+        self.previous_frame = None
+        self.grabber = SharedFrameReader(self.events, self.ring, buffer_size=self.capture_buffer_size,
+                                         name=f"shared-reader-{self.name or camera_index}",
+                                         detect_metric=self._detect_metric,
+                                         failures_metric=self._read_failures_metric)
+        self.grabber.listeners.append(self._on_captured_frame)
+        self.grabber.wants_frames = self._wants_frames
+        self.grabber.start()
+        self.is_running = True
+        return True
+
+    # Все кадры нужны основному процессу только для записи и пре-записи
+    def _wants_frames(self):
+        return self.recorder is not None or (self.preroll is not None and self.preroll_active)
+
+    def set_analysis_enabled(self, enabled):
+        if self.analysis_enabled is None:
+            return
+        if enabled:
+            if not self.analysis_enabled.is_set() and self.grabber:
+                # Вердикт, полученный до паузы, устарел: его кадр уже не то, что видит камера
+                self.grabber.discard_verdict()
+            self.analysis_enabled.set()
+        else:
+            self.analysis_enabled.clear()
+
+    def set_zones(self, zones):
+        super().set_zones(zones)
+        if self.commands is not None:
+            self.commands.put(("zones", self.zones.to_dict() if self.zones else None))
+
+    def set_analysis_interval(self, seconds):
+        if self.analysis_interval is not None:
+            self.analysis_interval.value = seconds
+
+    def detect_motion(self):
+        if not self.is_running or not self.grabber:
+            return None, []
+
+        captured, regions, dropped = self.grabber.latest_result()
+        if captured is None:
+            if dropped:
+                self.last_dropped_frames = dropped
+                self._dropped_metric.inc(dropped)
+            return None, []
+        # Анализ идет в процессе камеры, здесь только учет кадров
+        self._count_frame(captured, dropped)
+        if regions:
+            return captured.image, regions
+        return None, []
+
+    def stop_capture(self):
+        if self.recorder:
+            self.stop_video_recording()
+        if self.stop_event is not None:
+            self.stop_event.set()
+        if self.grabber:
+            self.grabber.stop()
+            self.grabber = None
+        if self.process is not None:
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout=2)
+            self.process = None
+        for channel in (self.events, self.commands):
+            if channel is not None:
+                channel.cancel_join_thread()
+                channel.close()
+        self.events = self.commands = None
+        if self.ring is not None:
+            self.ring.release()
+            self.ring = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+        if self.preroll:
+            self.preroll.clear()
+        self.is_running = False
+        self.previous_frame = None
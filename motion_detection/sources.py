@@ -0,0 +1,239 @@
+# motion_detection/sources.py
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+SYNTHETIC_SCENARIOS = ("static", "moving_blob", "lighting", "noise")
+
+
+# Общая часть источников кадров. Интерфейс совместим с cv2.VideoCapture
+# (isOpened/read/set/get/release), поэтому источник можно передать в MotionDetector.start_capture.
+# read_frame() дополнительно возвращает метку времени кадра в секундах от начала потока.
+class FrameSource:
+    def __init__(self, fps=15, realtime=False):
+        self.fps = fps
+        self.realtime = realtime  # выдавать кадры в темпе fps, как живая камера
+        self.exhausted = False
+        self.frame_index = 0
+        self.started_at = None
+
+    def isOpened(self):
+        return not self.exhausted
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.frame_index)
+        return 0.0
+
+    def _next_frame(self):
+        raise NotImplementedError
+
+    def _timestamp(self):
+        return self.frame_index / self.fps if self.fps else 0.0
+
+    def read_frame(self):
+        if self.exhausted:
+            return None
+        frame = self._next_frame()
+        if frame is None:
+            self.exhausted = True
+            return None
+        timestamp = self._timestamp()
+        self.frame_index += 1
+        if self.realtime and self.fps:
+            if self.started_at is None:
+                self.started_at = time.monotonic() - timestamp
+            delay = self.started_at + timestamp - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return timestamp, frame
+
+    def read(self):
+        result = self.read_frame()
+        if result is None:
+            return False, None
+        return True, result[1]
+
+    def release(self):
+        self.exhausted = True
+
+    def __iter__(self):
+        while True:
+            result = self.read_frame()
+            if result is None:
+                return
+            yield result
+
+
+class VideoFileSource(FrameSource):
+    def __init__(self, path, realtime=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        super().__init__(fps=fps or 15, realtime=realtime)
+        self.exhausted = not self.cap.isOpened()
+        self.position = 0.0
+
+    def _next_frame(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        self.position = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        return frame
+
+    def _timestamp(self):
+        # Время из контейнера точнее счетчика кадров при переменном FPS
+        return self.position if self.position > 0 else super()._timestamp()
+
+    def release(self):
+        super().release()
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    def __init__(self, directory, fps=15, realtime=False):
+        super().__init__(fps=fps, realtime=realtime)
+        self.directory = directory
+        self.files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        ) if os.path.isdir(directory) else []
+        self.exhausted = not self.files
+
+    def _next_frame(self):
+        while self.frame_index < len(self.files):
+            frame = cv2.imread(self.files[self.frame_index])
+            if frame is not None:
+                return frame
+            self.files.pop(self.frame_index)  # битый файл пропускаем
+        return None
+
+
+# Детерминированные синтетические сцены: одинаковый seed дает одинаковые кадры
+class SyntheticSource(FrameSource):
+    def __init__(self, scenario="moving_blob", width=640, height=480, fps=15, frames=None, seed=0,
+                 realtime=False):
+        if scenario not in SYNTHETIC_SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий {scenario}, доступны: {', '.join(SYNTHETIC_SCENARIOS)}")
+        super().__init__(fps=fps, realtime=realtime)
+        self.scenario = scenario
+        self.width = width
+        self.height = height
+        self.frames = frames  # None - бесконечный поток
+        self.rng = np.random.default_rng(seed)
+        background = self.rng.integers(0, 256, (max(1, height // 8), max(1, width // 8), 3), dtype=np.uint8)
+        self.background = cv2.resize(background, (width, height), interpolation=cv2.INTER_LINEAR)
+        self.blob_size = max(20, height // 6)
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        return super().get(prop)
+
+    def _next_frame(self):
+        if self.frames is not None and self.frame_index >= self.frames:
+            return None
+        i = self.frame_index
+        frame = self.background.copy()
+        if self.scenario == "moving_blob":
+            # Объект проходит через кадр за 2 секунды, затем 2 секунды пустой сцены
+            period = max(1, int(self.fps * 4))
+            phase = i % period
+            if phase < period // 2:
+                travel = self.width - self.blob_size
+                x = int(travel * phase / max(1, period // 2 - 1))
+                y = self.height // 3
+                cv2.rectangle(frame, (x, y), (x + self.blob_size, y + self.blob_size), (255, 255, 255), -1)
+        elif self.scenario == "lighting":
+            # Плавное изменение освещенности всей сцены
+            gain = 0.75 + 0.25 * np.sin(2 * np.pi * i / max(1, self.fps * 10))
+            frame = cv2.convertScaleAbs(frame, alpha=gain)
+        elif self.scenario == "noise":
+            noise = self.rng.integers(-12, 13, frame.shape, dtype=np.int16)
+            frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        return frame
+
+
+# Сценарий из нескольких сцен по очереди, по кругу: [("static", 5), ("moving_blob", 4)] - 5 секунд
+# пустой сцены, затем 4 секунды движения. Фон у всех сцен общий (одинаковый seed), поэтому смена
+# сцены сама по себе не дает движения.
+class ScriptedSource(FrameSource):
+    def __init__(self, script, width=640, height=480, fps=15, frames=None, seed=0, realtime=False):
+        super().__init__(fps=fps, realtime=realtime)
+        self.scenes = []
+        for scenario, seconds in script:
+            scene_frames = max(1, int(round(seconds * fps)))
+            self.scenes.append((SyntheticSource(scenario, width=width, height=height, fps=fps, seed=seed),
+                                scene_frames))
+        if not self.scenes:
+            raise ValueError("Пустой сценарий")
+        self.period = sum(scene_frames for _, scene_frames in self.scenes)
+        self.frames = frames
+        self.width = width
+        self.height = height
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        return super().get(prop)
+
+    def _next_frame(self):
+        if self.frames is not None and self.frame_index >= self.frames:
+            return None
+        position = self.frame_index % self.period
+        for scene, scene_frames in self.scenes:
+            if position < scene_frames:
+                scene.frame_index = position
+                return scene._next_frame()
+            position -= scene_frames
+        return None
+
+
+_SYNTHETIC_SPEC = re.compile(r"^(?P<script>[^@#]*)(?:@(?P<fps>\d+(?:\.\d+)?))?(?:#(?P<seed>\d+))?$")
+
+
+# "synthetic:<сценарий>[@fps][#seed]", сценарий - имя сцены или сцены с длительностью в секундах
+# через "+" (запятая разделяет камеры в CAMERA_SOURCES): "synthetic:static=5+moving_blob=4@30#2"
+def open_synthetic(spec, width=640, height=480, fps=15, realtime=False):
+    match = _SYNTHETIC_SPEC.match(spec)
+    if match is None:
+        raise ValueError(f"Неверное описание синтетического источника: {spec}")
+    fps = float(match.group("fps")) if match.group("fps") else fps
+    seed = int(match.group("seed") or 0)
+    script = match.group("script") or "moving_blob"
+    if "=" not in script:
+        return SyntheticSource(script, width=width, height=height, fps=fps, seed=seed, realtime=realtime)
+    scenes = []
+    for part in script.split("+"):
+        scenario, _, seconds = part.partition("=")
+        scenes.append((scenario.strip(), float(seconds or 1)))
+    return ScriptedSource(scenes, width=width, height=height, fps=fps, seed=seed, realtime=realtime)
+
+
+# Источник по строке: "synthetic:<сценарий>", каталог с картинками, видеофайл.
+# Для индексов камер и URL потоков возвращает None - их открывает cv2.VideoCapture.
+def open_source(spec, width=640, height=480, fps=15, realtime=False):
+    if isinstance(spec, FrameSource):
+        return spec
+    if not isinstance(spec, str):
+        return None
+    if spec.startswith("synthetic:"):
+        return open_synthetic(spec.split(":", 1)[1], width=width, height=height, fps=fps, realtime=realtime)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, fps=fps, realtime=realtime)
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, realtime=realtime)
+    return None
@@ -0,0 +1,177 @@
+# motion_detection/transcode.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import cv2
+
+from monitoring import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_ENCODE_SECONDS = REGISTRY.histogram("encode_seconds", "Время кодирования медиа для отправки")
+
+
+def _video_info(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 15
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        # Кадр из середины ролика для миниатюры
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frames // 2)
+        ok, frame = cap.read()
+    finally:
+        cap.release()
+    return fps, frames, width, height, frame if ok else None
+
+
+def _scaled_size(width, height, target_width):
+    if width <= target_width:
+        return width, height
+    # Четные размеры - требование большинства кодеков
+    return target_width // 2 * 2, int(height * target_width / width) // 2 * 2
+
+
+def _encode_ffmpeg(ffmpeg, source, output, size, bitrate_kbps):
+    command = [
+        ffmpeg, "-y", "-v", "error", "-i", source,
+        "-vf", f"scale={size[0]}:{size[1]}", "-c:v", "libx264", "-preset", "veryfast",
+        "-b:v", f"{bitrate_kbps}k", "-maxrate", f"{bitrate_kbps}k", "-bufsize", f"{bitrate_kbps * 2}k",
+        "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-an", output,
+    ]
+    subprocess.run(command, check=True, capture_output=True, timeout=600)
+
+
+def _encode_opencv(source, output, size, fps, stride):
+    # Без ffmpeg битрейт не задать: уменьшаем разрешение и, если нужно уложиться в размер, частоту кадров
+    cap = cv2.VideoCapture(source)
+    writer = cv2.VideoWriter(output, cv2.VideoWriter_fourcc(*"mp4v"), fps / stride, size)
+    try:
+        index = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if index % stride == 0:
+                writer.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+            index += 1
+    finally:
+        cap.release()
+        writer.release()
+
+
+# Выполняется в процессе пула: сжатая копия для отправки и миниатюра. Оригинал не трогается.
+def make_rendition(source, directory, width=640, bitrate_kbps=600, target_mb=8, thumbnail_width=320):
+    started = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.splitext(os.path.basename(source))[0]
+    output = os.path.join(directory, f"{base}_upload.mp4")
+    thumbnail = os.path.join(directory, f"{base}_thumb.jpg")
+
+    fps, frames, source_width, source_height, middle_frame = _video_info(source)
+    duration = frames / fps if fps else 0
+    size = _scaled_size(source_width, source_height, width)
+    # Битрейт ограничен так, чтобы ролик уложился в target_mb (10% - запас на контейнер)
+    if duration > 0 and target_mb > 0:
+        bitrate_kbps = max(64, min(bitrate_kbps, int(target_mb * 8 * 1024 * 0.9 / duration)))
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        _encode_ffmpeg(ffmpeg, source, output, size, bitrate_kbps)
+        encoder = "ffmpeg"
+    else:
+        # Размер копии оцениваем пропорционально числу пикселей, частоту кадров снижаем, только если иначе
+        # не уложиться в target_mb
+        estimated = os.path.getsize(source) * (size[0] * size[1]) / max(1, source_width * source_height)
+        stride = max(1, int(estimated // (target_mb * 1024 * 1024)) + 1) if target_mb > 0 else 1
+        _encode_opencv(source, output, size, fps, stride)
+        encoder = "opencv"
+
+    thumbnail_path = None
+    if middle_frame is not None:
+        thumb_size = _scaled_size(source_width, source_height, thumbnail_width)
+        thumb = cv2.resize(middle_frame, thumb_size, interpolation=cv2.INTER_AREA)
+        if cv2.imwrite(thumbnail, thumb, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+            thumbnail_path = thumbnail
+
+    return {
+        "video": output,
+        "thumbnail": thumbnail_path,
+        "width": size[0],
+        "height": size[1],
+        "source_width": source_width,
+        "source_height": source_height,
+        "duration": int(round(duration)),
+        "encoder": encoder,
+        "source_bytes": os.path.getsize(source),
+        "bytes": os.path.getsize(output),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+# Пул процессов перекодирования: кодирование занимает ядра процессора, а не цикл событий и не GIL
+class VideoTranscoder:
+    def __init__(self, directory, workers=1, width=640, bitrate_kbps=600, target_mb=8, thumbnail_width=320):
+        self.directory = directory
+        self.workers = max(1, workers)
+        self.settings = {"width": width, "bitrate_kbps": bitrate_kbps, "target_mb": target_mb,
+                         "thumbnail_width": thumbnail_width}
+        self.pool = None
+        self.transcoded = 0
+        self.failed = 0
+        self.source_bytes = 0
+        self.upload_bytes = 0
+
+    def start(self):
+        if self.pool is None:
+            # spawn, как и у процессов камер: в основном процессе уже работают потоки
+            self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context("spawn"))
+
+    async def transcode(self, path):
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.pool, partial(make_rendition, path, self.directory,
+                                                                   **self.settings))
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Не удалось перекодировать {path}: {e}")
+            return None
+        self.transcoded += 1
+        self.source_bytes += result["source_bytes"]
+        self.upload_bytes += result["bytes"]
+        _ENCODE_SECONDS.labels(kind="video").observe(result["seconds"])
+        logger.info(f"Перекодировано {path}: {result['source_bytes'] // 1024} -> {result['bytes'] // 1024} КБ "
+                    f"({result['encoder']}, {result['seconds']} сек)")
+        return result
+
+    @staticmethod
+    def cleanup(result):
+        for key in ("video", "thumbnail"):
+            if result and result.get(key):
+                try:
+                    os.remove(result[key])
+                except OSError:
+                    pass
+
+    def stats(self):
+        return {
+            "transcoded": self.transcoded,
+            "failed": self.failed,
+            "source_mb": round(self.source_bytes / (1024 * 1024), 2),
+            "upload_mb": round(self.upload_bytes / (1024 * 1024), 2),
+        }
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
@@ -0,0 +1,83 @@
+# motion_detection/zones.py
+import json
+import logging
+import os
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Зоны детекции камеры: многоугольники в долях кадра (0..1), поэтому не зависят от разрешения.
+# include - где искать движение (пусто - весь кадр), exclude - что игнорировать (деревья, дорога, индикаторы).
+# Маска растеризуется один раз на размер кадра и кешируется.
+class DetectionZones:
+    def __init__(self, include=None, exclude=None):
+        self.include = [self._validate(polygon) for polygon in include or []]
+        self.exclude = [self._validate(polygon) for polygon in exclude or []]
+        self._cache = {}
+
+    @staticmethod
+    def _validate(polygon):
+        if any(len(point) != 2 for point in polygon):
+            raise ValueError("Точка зоны задается двумя координатами x,y")
+        points = [(float(x), float(y)) for x, y in polygon]
+        if len(points) < 3:
+            raise ValueError("Многоугольник зоны должен иметь не меньше трех точек")
+        if any(not (0.0 <= value <= 1.0) for point in points for value in point):
+            raise ValueError("Координаты зоны задаются в долях кадра от 0 до 1")
+        return points
+
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(include=data.get("include"), exclude=data.get("exclude"))
+
+    def to_dict(self):
+        return {"include": [list(map(list, p)) for p in self.include],
+                "exclude": [list(map(list, p)) for p in self.exclude]}
+
+    @property
+    def is_empty(self):
+        return not self.include and not self.exclude
+
+    @staticmethod
+    def _to_pixels(polygon, width, height):
+        return np.array([[round(x * (width - 1)), round(y * (height - 1))] for x, y in polygon], dtype=np.int32)
+
+    # (маска, рамка): маска обрезана до рамки (x, y, w, h) включенных зон, 255 - анализировать
+    def mask(self, width, height):
+        key = (width, height)
+        if key not in self._cache:
+            mask = np.zeros((height, width), dtype=np.uint8) if self.include else \
+                np.full((height, width), 255, dtype=np.uint8)
+            for polygon in self.include:
+                cv2.fillPoly(mask, [self._to_pixels(polygon, width, height)], 255)
+            for polygon in self.exclude:
+                cv2.fillPoly(mask, [self._to_pixels(polygon, width, height)], 0)
+            x, y, w, h = cv2.boundingRect(mask)
+            if w == 0 or h == 0:
+                x, y, w, h = 0, 0, 1, 1  # зоны исключили весь кадр
+            self._cache[key] = (np.ascontiguousarray(mask[y:y + h, x:x + w]), (x, y, w, h))
+        return self._cache[key]
+
+
+# Зоны всех камер: {"1": {"include": [...], "exclude": [...]}, ...}, ключ - номер камеры с 1.
+# Файл, сохраненный ботом, важнее значения из конфигурации.
+def load_zones(path, default_json=""):
+    try:
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        return json.loads(default_json) if default_json else {}
+    except (OSError, ValueError) as e:
+        logger.error(f"Не удалось прочитать зоны детекции: {e}")
+        return {}
+
+
+def save_zones(path, zones):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(zones, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,3 @@
+# storage/__init__.py
+from .manager import StorageManager
+from .events import EventIndex
@@ -0,0 +1,187 @@
+# storage/events.py
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    objects TEXT NOT NULL,
+    motion_area INTEGER NOT NULL,
+    media_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS event_media (
+    path TEXT PRIMARY KEY,
+    event_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS event_media_event ON event_media (event_id);
+"""
+
+# Сколько записей поток пишет одной транзакцией
+_BATCH_SIZE = 64
+
+
+# Журнал событий движения в SQLite (WAL): время, камера, файлы, объекты, площадь движения.
+# Запись идет в отдельном потоке пачками, основной цикл только кладет событие в очередь.
+# Чтение - отдельным соединением: в режиме WAL оно не ждет записи.
+# Выборки идут по индексу времени с постраничной навигацией по id, поэтому не зависят от размера журнала.
+class EventIndex:
+    def __init__(self, path, retention_days=30, queue_size=1024):
+        self.path = path
+        self.retention_seconds = retention_days * 86400 if retention_days > 0 else 0
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.thread = None
+        self.reader = None
+        self.read_lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+        self.forgotten = 0
+        self.pruned = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def start(self):
+        if self.thread is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        writer = self._connect()
+        writer.executescript(_SCHEMA)
+        writer.commit()
+        self.reader = self._connect()
+        self.thread = threading.Thread(target=self._run, args=(writer,), name="event-index", daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        if self.thread is None:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Очередь журнала событий переполнена, событие не записано.")
+
+    # Можно вызывать из любого потока. media - пути файлов события (могут отсутствовать).
+    def record(self, camera, kind, media=(), objects=(), motion_area=0, timestamp=None):
+        media = [path for path in media if path]
+        self._put(("record", (timestamp or time.time(), str(camera), kind, list(objects or ()),
+                              int(motion_area), media)))
+
+    # Файл удален очисткой хранилища. Событие удаляется вместе с последним своим файлом.
+    def forget_media(self, path, category_name=None):
+        self._put(("forget", path))
+
+    def _run(self, connection):
+        next_prune = 0.0
+        running = True
+        while running:
+            items = [self.queue.get()]
+            while len(items) < _BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with connection:
+                    for op, payload in items:
+                        if op == "stop":
+                            running = False
+                        elif op == "record":
+                            self._insert(connection, *payload)
+                        elif op == "forget":
+                            self._delete_media(connection, payload)
+                    now = time.time()
+                    if self.retention_seconds and now >= next_prune:
+                        self._prune(connection, now - self.retention_seconds)
+                        next_prune = now + 3600
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи журнала событий: {e}")
+        connection.close()
+
+    def _insert(self, connection, timestamp, camera, kind, objects, motion_area, media):
+        cursor = connection.execute(
+            "INSERT INTO events (ts, camera, kind, objects, motion_area, media_count) VALUES (?, ?, ?, ?, ?, ?)",
+            (timestamp, camera, kind, json.dumps(objects, ensure_ascii=False), motion_area, len(media)))
+        connection.executemany("INSERT OR REPLACE INTO event_media (path, event_id) VALUES (?, ?)",
+                               [(path, cursor.lastrowid) for path in media])
+        self.recorded += 1
+
+    def _delete_media(self, connection, path):
+        row = connection.execute("SELECT event_id FROM event_media WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        connection.execute("DELETE FROM event_media WHERE path = ?", (path,))
+        left = connection.execute("SELECT 1 FROM event_media WHERE event_id = ? LIMIT 1", row).fetchone()
+        if left is None:
+            connection.execute("DELETE FROM events WHERE id = ?", row)
+            self.forgotten += 1
+
+    def _prune(self, connection, before):
+        connection.execute("DELETE FROM event_media WHERE event_id IN (SELECT id FROM events WHERE ts < ?)",
+                           (before,))
+        self.pruned += connection.execute("DELETE FROM events WHERE ts < ?", (before,)).rowcount
+
+    # События новее since (по убыванию времени), страница - limit записей с id меньше before_id
+    def query(self, since=None, before_id=None, camera=None, limit=10):
+        conditions, params = [], []
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        if camera is not None:
+            conditions.append("camera = ?")
+            params.append(str(camera))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.read_lock:
+            rows = self.reader.execute(
+                f"SELECT id, ts, camera, kind, objects, motion_area, media_count FROM events {where} "
+                f"ORDER BY id DESC LIMIT ?", (*params, limit)).fetchall()
+            media = {}
+            if rows:
+                placeholders = ",".join("?" * len(rows))
+                for path, event_id in self.reader.execute(
+                        f"SELECT path, event_id FROM event_media WHERE event_id IN ({placeholders})",
+                        [row[0] for row in rows]):
+                    media.setdefault(event_id, []).append(path)
+        return [
+            {"id": event_id, "ts": ts, "camera": camera, "kind": kind, "objects": json.loads(objects),
+             "motion_area": motion_area, "media_count": media_count, "media": sorted(media.get(event_id, []))}
+            for event_id, ts, camera, kind, objects, motion_area, media_count in rows
+        ]
+
+    def count(self, since=None):
+        with self.read_lock:
+            if since is None:
+                return self.reader.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+            return self.reader.execute("SELECT COUNT(*) FROM events WHERE ts >= ?", (since,)).fetchone()[0]
+
+    def stats(self):
+        return {"recorded": self.recorded, "dropped": self.dropped, "forgotten": self.forgotten,
+                "pruned": self.pruned, "queue": self.queue.qsize()}
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.queue.put(("stop", None))
+        self.thread.join(timeout=5)
+        self.thread = None
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
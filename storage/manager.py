@@ -0,0 +1,159 @@
+# storage/manager.py
+import asyncio
+import heapq
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Category:
+    def __init__(self, directory, quota_bytes):
+        self.directory = directory
+        self.quota_bytes = quota_bytes
+        self.heap = []  # (mtime, path) - самый старый файл сверху
+        self.sizes = {}  # path -> (size, mtime); запись кучи с другим mtime устарела
+        self.used_bytes = 0
+        self.evicted_files = 0
+
+
+# Индекс файлов в памяти: размеры и возраст по типам медиа.
+# Каталоги сканируются один раз при старте, дальше индекс пополняется
+# по мере появления новых файлов, а старые файлы удаляются в фоне за O(log n).
+class StorageManager:
+    def __init__(self, low_watermark=0.8):
+        self.low_watermark = low_watermark
+        self.categories = {}
+        self.lock = threading.Lock()
+        self.wakeup = None
+        self.loop = None
+        # Вызываются как listener(path, category_name) после удаления файла при очистке
+        self.removal_listeners = []
+
+    def add_category(self, name, directory, quota_mb):
+        self.categories[name] = _Category(directory, int(quota_mb * 1024 * 1024))
+
+    def bootstrap(self):
+        for name, category in self.categories.items():
+            os.makedirs(category.directory, exist_ok=True)
+            count = 0
+            with os.scandir(category.directory) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    with self.lock:
+                        self._index(category, entry.path, stat.st_mtime, stat.st_size)
+                    count += 1
+            logger.info(f"Хранилище {name}: {count} файлов, {category.used_bytes / (1024 * 1024):.1f} МБ")
+
+    def _index(self, category, path, mtime, size):
+        previous = category.sizes.get(path)
+        if previous is not None:
+            category.used_bytes -= previous[0]
+        if previous is None or previous[1] != mtime:
+            heapq.heappush(category.heap, (mtime, path))
+        category.sizes[path] = (size, mtime)
+        category.used_bytes += size
+
+    def _reindex(self, category, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self.lock:
+            self._index(category, path, stat.st_mtime, stat.st_size)
+
+    # Регистрирует новый файл; можно вызывать из любого потока
+    def add_file(self, path, category_name):
+        category = self.categories.get(category_name)
+        if category is None or not path:
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self.lock:
+            self._index(category, path, stat.st_mtime, stat.st_size)
+            over_quota = category.used_bytes > category.quota_bytes
+        if over_quota:
+            self._wake()
+
+    def forget_file(self, path, category_name):
+        category = self.categories.get(category_name)
+        if category is None:
+            return
+        with self.lock:
+            entry = category.sizes.pop(path, None)
+            if entry is not None:
+                category.used_bytes -= entry[0]
+            # Запись в куче станет "висячей" и будет пропущена при вытеснении
+
+    def _wake(self):
+        if self.loop is not None and self.wakeup is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def enforce_quotas(self):
+        removed = []
+        for name, category in self.categories.items():
+            with self.lock:
+                if category.used_bytes <= category.quota_bytes:
+                    continue
+                target = category.quota_bytes * self.low_watermark
+                victims = []
+                while category.heap and category.used_bytes > target:
+                    mtime, path = heapq.heappop(category.heap)
+                    entry = category.sizes.get(path)
+                    # Файл забыт или добавлен заново позже: у актуальной записи кучи свой mtime
+                    if entry is None or entry[1] != mtime:
+                        continue
+                    del category.sizes[path]
+                    category.used_bytes -= entry[0]
+                    victims.append(path)
+
+            for path in victims:
+                try:
+                    os.remove(path)
+                    category.evicted_files += 1
+                    removed.append((name, path))
+                    logger.info(f"Удален старый файл: {path}")
+                    self._notify_removed(path, name)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    # Файл остался на диске - возвращаем его в учет, иначе квота будет занижена
+                    logger.warning(f"Не удалось удалить {path}: {e}")
+                    self._reindex(category, path)
+        return removed
+
+    def _notify_removed(self, path, category_name):
+        for listener in self.removal_listeners:
+            try:
+                listener(path, category_name)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика удаления файла {path}: {e}", exc_info=True)
+
+    async def run(self):
+        # Фоновая задача: просыпается, когда какой-то тип медиа превысил квоту
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.wakeup.set()
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            removed = await asyncio.to_thread(self.enforce_quotas)
+            if removed:
+                logger.info(f"Очистка хранилища: удалено файлов {len(removed)}, использование: {self.usage()}")
+
+    def usage(self):
+        with self.lock:
+            return {
+                name: {
+                    "files": len(category.sizes),
+                    "bytes": category.used_bytes,
+                    "quota_bytes": category.quota_bytes,
+                    "evicted_files": category.evicted_files,
+                }
+                for name, category in self.categories.items()
+            }